@@ -63,7 +63,7 @@ WSGI_APPLICATION = 'foodgram.wsgi.application'
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        'ENGINE': os.getenv('DB_ENGINE', 'django.db.backends.postgresql'),
         'NAME': os.getenv('POSTGRES_DB', 'django'),
         'USER': os.getenv('POSTGRES_USER', 'django'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', ''),
@@ -72,6 +72,35 @@ DATABASES = {
     }
 }
 
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    }
+}
+
+RECIPES_CACHE_TIMEOUT = int(os.getenv('RECIPES_CACHE_TIMEOUT', 300))
+
+IMAGE_UPLOAD_MAX_SIZE = int(os.getenv('IMAGE_UPLOAD_MAX_SIZE',
+                                      10 * 1024 * 1024))
+IMAGE_MAX_PIXELS = int(os.getenv('IMAGE_MAX_PIXELS', 40_000_000))
+IMAGE_RENDITION_WIDTHS = tuple(
+    int(width) for width in os.getenv(
+        'IMAGE_RENDITION_WIDTHS', '320,640,1280').split(',')
+)
+IMAGE_RENDITION_WORKERS = int(os.getenv('IMAGE_RENDITION_WORKERS', 2))
+
+FEED_MAX_FOLLOWED = int(os.getenv('FEED_MAX_FOLLOWED', 300))
+FEED_TIMELINE_SIZE = int(os.getenv('FEED_TIMELINE_SIZE', 1000))
+
+# Без SHORT_LINK_BASE_URL ссылки строятся от адреса запроса.
+SHORT_LINK_BASE_URL = os.getenv('SHORT_LINK_BASE_URL', '')
+SHORT_LINK_SECRET = os.getenv('SHORT_LINK_SECRET', SECRET_KEY)
+SHORT_LINK_FLUSH_SIZE = int(os.getenv('SHORT_LINK_FLUSH_SIZE', 100))
+SHORT_LINK_FLUSH_INTERVAL = int(os.getenv('SHORT_LINK_FLUSH_INTERVAL', 10))
+
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -127,4 +156,11 @@ DJOSER = {
 
 COMMANDS = [
     'foods.management.commands.import_ingredients',
+    'foods.management.commands.check_query_budget',
+    'foods.management.commands.rebuild_shopping_lists',
+    'foods.management.commands.reconcile_counters',
+    'foods.management.commands.build_renditions',
+    'foods.management.commands.export_recipes',
+    'foods.management.commands.import_recipes',
+    'foods.management.commands.rebuild_feed_timelines',
 ]
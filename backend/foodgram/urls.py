@@ -4,7 +4,8 @@ from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import include, path
 from rest_framework import routers
-from foods.views import IngredientsListView, RecipeListView, TagsListView
+from foods.views import (IngredientsListView, RecipeListView, TagsListView,
+                         short_link_redirect)
 from users.views import UserViewSet
 
 router = routers.DefaultRouter()
@@ -18,8 +19,9 @@ urlpatterns = [
     path('api/auth/', include('djoser.urls.authtoken')),
     path('api/', include(router.urls)),
     path('admin/', admin.site.urls),
-    path('api/users/me/avatar/', UserViewSet.as_view({'put': 'avatar'})),
-    path("s/", include("urlshortner.urls")),
+    path('api/users/me/avatar/',
+         UserViewSet.as_view({'put': 'avatar'}, **UserViewSet.avatar.kwargs)),
+    path('s/<str:code>', short_link_redirect, name='short-link'),
 ]
 
 if settings.DEBUG:
@@ -1,8 +1,22 @@
 """Admin panel."""
 from django.contrib import admin
+from django.db.models import Count, IntegerField, OuterRef, Subquery
 
 from .models import (Favorites, Follow, IngredientRecipe, Ingredients, Recipe,
                      Tag, TagRecipe)
+from .pagination import EstimatedCountPaginator
+
+
+def count_related(model, field):
+    """Подзапрос количества строк model, ссылающихся на объект через field.
+
+    Коррелированный подзапрос считается только для строк текущей
+    страницы, в отличие от Count() с GROUP BY по всей таблице.
+    """
+    return Subquery(
+        model.objects.filter(**{field: OuterRef('pk')}).order_by().values(
+            field).annotate(total=Count('id')).values('total'),
+        output_field=IntegerField())
 
 
 class RecipeInline(admin.TabularInline):
@@ -10,6 +24,11 @@ class RecipeInline(admin.TabularInline):
 
     model = IngredientRecipe
     extra = 1
+    autocomplete_fields = ('name',)
+
+    def get_queryset(self, request):
+        """Ингредиенты рецепта вместе с названиями для виджетов."""
+        return super().get_queryset(request).select_related('name')
 
 
 class RecipesInline(admin.TabularInline):
@@ -17,42 +36,93 @@ class RecipesInline(admin.TabularInline):
 
     model = TagRecipe
     extra = 1
+    autocomplete_fields = ('name',)
+
+    def get_queryset(self, request):
+        """Теги рецепта вместе с названиями для виджетов."""
+        return super().get_queryset(request).select_related('name')
 
 
 class IngredientsAdmin(admin.ModelAdmin):
-    """Модель ингридиентов."""
+    """Настройки ингредиентов."""
+
+    list_display = ('name', 'measurement_unit', 'count_recipes')
+    search_fields = ('name', )
+    ordering = ('name',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
-    inlines = [RecipeInline]
+    def get_queryset(self, request):
+        """Ингредиенты с количеством рецептов."""
+        return super().get_queryset(request).annotate(
+            recipes_total=count_related(IngredientRecipe, 'name'))
+
+    @admin.display(description='Рецептов', ordering='recipes_total')
+    def count_recipes(self, obj):
+        """Количество рецептов с ингредиентом."""
+        return obj.recipes_total or 0
 
 
 class TagsAdmin(admin.ModelAdmin):
-    """Модель тегов."""
+    """Настройки тегов."""
+
+    list_display = ('name', 'slug', 'count_recipes')
+    search_fields = ('name', 'slug')
+    ordering = ('name',)
+    prepopulated_fields = {'slug': ('name',)}
+
+    def get_queryset(self, request):
+        """Теги с количеством рецептов."""
+        return super().get_queryset(request).annotate(
+            recipes_total=count_related(TagRecipe, 'name'))
 
-    inlines = [RecipeInline]
+    @admin.display(description='Рецептов', ordering='recipes_total')
+    def count_recipes(self, obj):
+        """Количество рецептов с тегом."""
+        return obj.recipes_total or 0
 
 
 class RecipeAdmin(admin.ModelAdmin):
     """Настройки рецептов."""
 
     list_display = ('name', 'author', 'count_favorites')
-    search_fields = ('author__username', 'name')
+    readonly_fields = ('favorites_count', 'image_rendered', 'link_hits')
+    list_select_related = ('author',)
+    search_fields = ('name',)
     list_filter = ('tags',)
+    autocomplete_fields = ('author',)
     inlines = [RecipeInline, RecipesInline]
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
+    @admin.display(description='В избранном', ordering='favorites_count')
     def count_favorites(self, obj):
         """Количество добавлений репецта в избранное."""
-        return obj.favorites.count()
+        return obj.favorites_count
 
 
-class IngredientAdmin(admin.ModelAdmin):
-    """Настройки ингедиентов."""
+class FollowAdmin(admin.ModelAdmin):
+    """Настройки подписок."""
 
-    list_display = ('name', 'measurement_unit')
-    search_fields = ('name', )
+    list_display = ('user', 'author')
+    list_select_related = ('user', 'author')
+    autocomplete_fields = ('user', 'author')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+class FavoritesAdmin(admin.ModelAdmin):
+    """Настройки избранного."""
+
+    list_display = ('user', 'recipe')
+    list_select_related = ('user', 'recipe')
+    autocomplete_fields = ('user', 'recipe')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 admin.site.register(Recipe, RecipeAdmin)
-admin.site.register(Ingredients, IngredientAdmin)
-admin.site.register(Tag)
-admin.site.register(Follow)
-admin.site.register(Favorites)
+admin.site.register(Ingredients, IngredientsAdmin)
+admin.site.register(Tag, TagsAdmin)
+admin.site.register(Follow, FollowAdmin)
+admin.site.register(Favorites, FavoritesAdmin)
@@ -8,3 +8,7 @@ class FoodsConfig(AppConfig):
 
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'foods'
+
+    def ready(self):
+        """Подключение сигналов."""
+        from . import signals  # noqa: F401
@@ -0,0 +1,59 @@
+"""Кэширование ответов для анонимных пользователей."""
+
+from functools import wraps
+from hashlib import md5
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.response import Response
+
+from .counters import get_favorites_version
+from .stamps import bump_stamp, get_stamp
+
+CONTENT_STAMP_NAME = 'recipes'
+
+
+def get_content_version():
+    """Текущая версия содержимого рецептов, общая для всех процессов."""
+    return get_stamp(CONTENT_STAMP_NAME)
+
+
+def bump_content_version():
+    """Смена версии, после которой закэшированные ответы не используются."""
+    bump_stamp(CONTENT_STAMP_NAME)
+
+
+def response_cache_key(request):
+    """Ключ кэша из адреса, параметров запроса и версий данных.
+
+    В ответах есть favorites_count, а избранное не меняет версию
+    содержимого, поэтому в ключ входит и версия избранного.
+    """
+    query = sorted(
+        (key, value)
+        for key, values in request.query_params.lists()
+        for value in values
+    )
+    digest = md5(
+        f'{request.get_host()}{request.path}?{query}'.encode()
+    ).hexdigest()
+    return (f'recipes_response:{get_content_version()}:'
+            f'{get_favorites_version()}:{digest}')
+
+
+def cache_anonymous_response(method):
+    """Кэширование успешных ответов метода viewset для анонимов."""
+    @wraps(method)
+    def wrapper(self, request, *args, **kwargs):
+        if request.user.is_authenticated:
+            return method(self, request, *args, **kwargs)
+        key = response_cache_key(request)
+        data = cache.get(key)
+        if data is not None:
+            return Response(data)
+        response = method(self, request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            cache.set(key, response.data, settings.RECIPES_CACHE_TIMEOUT)
+        return response
+    return wrapper
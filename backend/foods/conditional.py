@@ -0,0 +1,71 @@
+"""Условные GET-запросы: ETag, Last-Modified и ответ 304."""
+
+from functools import wraps
+from hashlib import md5
+
+from django.contrib.auth import get_user_model
+from django.db.models import Count, Max, OuterRef, Subquery
+from django.utils.cache import get_conditional_response, quote_etag
+from django.utils.http import http_date
+
+from .models import Favorites, Follow, ShoppingCart
+
+User = get_user_model()
+
+
+def viewer_stamp(user):
+    """Отпечаток избранного, списка покупок и подписок пользователя.
+
+    Эти связи меняют поля is_favorited, is_in_shopping_cart и
+    is_subscribed в ответе, но не дату публикации рецепта.
+    """
+    if user.is_anonymous:
+        return None
+    stamps = {}
+    for name, model in (('favorites', Favorites),
+                        ('carts', ShoppingCart),
+                        ('follows', Follow)):
+        rows = model.objects.filter(
+            user=OuterRef('pk')
+        ).order_by().values('user')
+        stamps[f'{name}_count'] = Subquery(
+            rows.annotate(value=Count('id')).values('value'))
+        stamps[f'{name}_max'] = Subquery(
+            rows.annotate(value=Max('id')).values('value'))
+    row = User.objects.filter(pk=user.pk).values(**stamps).first()
+    return tuple(row.values())
+
+
+def conditional_response(validators):
+    """Ответ 304 без сериализации, если ETag или дата не изменились.
+
+    validators(view, request, *args, **kwargs) возвращает кортеж из
+    частей ETag и даты последнего изменения (или None). Last-Modified
+    отдаётся только анонимам: для остальных ответ зависит ещё и от
+    связей пользователя, которые учитывает только ETag.
+    """
+    def decorator(method):
+        @wraps(method)
+        def wrapper(self, request, *args, **kwargs):
+            parts, last_modified = validators(self, request, *args, **kwargs)
+            etag = quote_etag(md5(repr((
+                request.get_full_path(),
+                request.accepted_renderer.format,
+                viewer_stamp(request.user),
+                *parts,
+            )).encode()).hexdigest())
+            timestamp = None
+            if last_modified and request.user.is_anonymous:
+                timestamp = int(last_modified.timestamp())
+            not_modified = get_conditional_response(
+                request, etag=etag, last_modified=timestamp)
+            if not_modified is not None:
+                return not_modified
+            response = method(self, request, *args, **kwargs)
+            if response.status_code == 200:
+                response['ETag'] = etag
+                if timestamp is not None:
+                    response['Last-Modified'] = http_date(timestamp)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,117 @@
+"""Счётчики избранного у рецептов и рецептов у авторов.
+
+Код API меняет счётчики атомарным UPDATE с F() в тех же транзакциях,
+что и связи, которые они считают: связи он пишет сырым SQL без сигналов.
+Изменения через модели (админка, каскадное удаление пользователя или
+рецепта, создание и удаление рецепта) учитывают сигналы: они планируют
+пересчёт затронутых счётчиков после коммита. Значение не опускается
+ниже нуля, даже если счётчик уже разошёлся с данными: такие расхождения
+после изменений в обход моделей исправляет команда reconcile_counters.
+
+Любое изменение избранного меняет версию FAVORITES_STAMP_NAME: по ней
+проверяются ETag списков и рецептов, в которых есть favorites_count.
+"""
+
+import threading
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import Favorites, Recipe
+from .stamps import bump_stamp, get_stamp
+
+User = get_user_model()
+
+BATCH_SIZE = 1000
+FAVORITES_STAMP_NAME = 'favorites'
+
+_local = threading.local()
+
+
+def get_favorites_version():
+    """Текущая версия избранного, общая для всех процессов."""
+    return get_stamp(FAVORITES_STAMP_NAME)
+
+
+def bump_favorites_version():
+    """Смена версии избранного после коммита.
+
+    Строка версии общая для всех пользователей, поэтому она меняется
+    вне транзакции и не держит блокировку до её конца.
+    """
+    transaction.on_commit(lambda: bump_stamp(FAVORITES_STAMP_NAME))
+
+
+def change_favorites_count(recipe_ids, delta):
+    """Изменение favorites_count рецептов recipe_ids на delta."""
+    if recipe_ids:
+        Recipe.objects.filter(pk__in=recipe_ids).update(
+            favorites_count=Greatest(F('favorites_count') + delta, 0))
+        bump_favorites_version()
+
+
+def count_favorites_added(user, *recipe_ids):
+    """Учёт рецептов, добавленных пользователем в избранное."""
+    change_favorites_count(recipe_ids, 1)
+
+
+def count_favorites_removed(user, *recipe_ids):
+    """Учёт рецептов, удалённых пользователем из избранного."""
+    change_favorites_count(recipe_ids, -1)
+
+
+def change_recipes_count(user_id, delta):
+    """Изменение recipes_count автора user_id на delta."""
+    User.objects.filter(pk=user_id).update(
+        recipes_count=Greatest(F('recipes_count') + delta, 0))
+
+
+def recount(model, ids, field, related, foreign_key):
+    """Пересчёт счётчика field объектов ids по строкам related.
+
+    Строки блокируются до подсчёта, как в reconcile_counters: изменения,
+    закоммиченные позже, применят свой F() поверх пересчитанного
+    значения.
+    """
+    ids = sorted(ids)
+    total = related.objects.filter(
+        **{foreign_key: OuterRef('pk')}
+    ).order_by().values(foreign_key).annotate(
+        total=Count('id')).values('total')
+    for start in range(0, len(ids), BATCH_SIZE):
+        batch = ids[start:start + BATCH_SIZE]
+        with transaction.atomic():
+            list(model.objects.select_for_update().filter(
+                pk__in=batch).order_by('pk').values_list('pk', flat=True))
+            model.objects.filter(pk__in=batch).update(
+                **{field: Coalesce(Subquery(total), 0)})
+
+
+def schedule_recount(recipe_ids=(), user_ids=()):
+    """Пересчёт после коммита избранного рецептов и рецептов авторов.
+
+    Все вызовы одной транзакции копятся в общем наборе, и первый
+    обработчик on_commit пересчитывает их. Пересчёт не зависит от
+    того, сколько раз объект попал в набор, поэтому остаток набора
+    после отката транзакции ничего не портит.
+    """
+    if not hasattr(_local, 'recipes'):
+        _local.recipes, _local.users = set(), set()
+    _local.recipes.update(recipe_ids)
+    _local.users.update(user_ids)
+    transaction.on_commit(recount_scheduled)
+
+
+def recount_scheduled():
+    """Пересчёт счётчиков, запланированных schedule_recount."""
+    recipe_ids, user_ids = _local.recipes, _local.users
+    if not recipe_ids and not user_ids:
+        return
+    _local.recipes, _local.users = set(), set()
+    if recipe_ids:
+        recount(Recipe, recipe_ids, 'favorites_count', Favorites, 'recipe')
+        # Обработчик уже выполняется после коммита.
+        bump_stamp(FAVORITES_STAMP_NAME)
+    recount(User, user_ids, 'recipes_count', Recipe, 'author')
@@ -0,0 +1,153 @@
+"""Индекс покрытия рецептов имеющимися ингредиентами."""
+
+import threading
+from array import array
+from bisect import bisect_left, insort
+from collections import Counter, defaultdict
+
+from django.db.models import Subquery
+
+from .models import IngredientRecipe, RecipeChange, TagRecipe
+from .stamps import bump_stamp, get_stamp
+
+STAMP_NAME = 'coverage'
+# При большем отставании дешевле перестроить индекс целиком.
+MAX_PENDING_CHANGES = 1000
+# Столько последних записей RecipeChange хранится, более старые
+# удаляются: процесс, отставший больше чем на MAX_PENDING_CHANGES
+# записей, всё равно перестраивает индекс целиком.
+KEEP_CHANGES = 10 * MAX_PENDING_CHANGES
+
+
+class CoverageIndex:
+    """Обратный индекс ингредиент -> отсортированный массив id рецептов.
+
+    Индекс строится при первом обращении. Изменённые рецепты
+    записываются в таблицу RecipeChange под возрастающими номерами, и
+    каждый процесс перечитывает из базы только их. Если изменений
+    слишком много или сменилась версия в ChangeStamp, индекс строится
+    заново.
+    """
+
+    def __init__(self):
+        """Создание пустого индекса."""
+        self._lock = threading.Lock()
+        self._version = None
+        self._sequence = 0
+        self._postings = defaultdict(lambda: array('q'))
+        self._recipes = {}
+
+    def invalidate(self):
+        """Полное перестроение индекса во всех процессах."""
+        bump_stamp(STAMP_NAME)
+        self._version = None
+
+    def mark_changed(self, recipe_ids):
+        """Запись об изменении ингредиентов или тегов рецептов."""
+        recipe_ids = list(recipe_ids)
+        if not recipe_ids:
+            return
+        RecipeChange.objects.bulk_create(
+            RecipeChange(recipe_id=recipe_id) for recipe_id in recipe_ids)
+        last = RecipeChange.objects.order_by('-id').values('id')[:1]
+        RecipeChange.objects.filter(
+            id__lte=Subquery(last) - KEEP_CHANGES).delete()
+
+    def _refresh(self):
+        """Применение изменений или полное перестроение индекса."""
+        version = get_stamp(STAMP_NAME)
+        with self._lock:
+            if version != self._version:
+                self._rebuild(version)
+                return
+            changes = list(RecipeChange.objects.filter(
+                id__gt=self._sequence
+            ).order_by('id').values_list(
+                'id', 'recipe_id')[:MAX_PENDING_CHANGES + 1])
+            if not changes:
+                return
+            if len(changes) > MAX_PENDING_CHANGES:
+                self._rebuild(version)
+                return
+            changed = {recipe_id for _, recipe_id in changes}
+            self._forget(changed)
+            self._load(changed)
+            self._sequence = changes[-1][0]
+
+    def _rebuild(self, version):
+        """Загрузка всех рецептов в пустой индекс."""
+        # Номер читается до загрузки: изменения, записанные во время
+        # неё, применятся ещё раз при следующем обращении.
+        self._sequence = RecipeChange.objects.order_by('-id').values_list(
+            'id', flat=True).first() or 0
+        self._postings.clear()
+        self._recipes.clear()
+        self._load()
+        self._version = version
+
+    def _forget(self, recipe_ids):
+        """Удаление рецептов из индекса перед повторной загрузкой."""
+        for recipe_id in recipe_ids:
+            ingredients, _ = self._recipes.pop(recipe_id, ((), ()))
+            for ingredient_id in ingredients:
+                postings = self._postings[ingredient_id]
+                position = bisect_left(postings, recipe_id)
+                if (position < len(postings)
+                        and postings[position] == recipe_id):
+                    del postings[position]
+
+    def _load(self, recipe_ids=None):
+        """Загрузка ингредиентов и тегов рецептов (всех, если None)."""
+        ingredient_rows = IngredientRecipe.objects.order_by('recipe_id')
+        tag_rows = TagRecipe.objects.all()
+        if recipe_ids is not None:
+            ingredient_rows = ingredient_rows.filter(recipe_id__in=recipe_ids)
+            tag_rows = tag_rows.filter(recipe_id__in=recipe_ids)
+        ingredients = defaultdict(list)
+        for recipe_id, ingredient_id in ingredient_rows.values_list(
+                'recipe_id', 'name_id').iterator():
+            ingredients[recipe_id].append(ingredient_id)
+        tags = defaultdict(list)
+        for recipe_id, tag_id in tag_rows.values_list(
+                'recipe_id', 'name_id').iterator():
+            tags[recipe_id].append(tag_id)
+
+        for recipe_id, ingredient_ids in ingredients.items():
+            self._recipes[recipe_id] = (tuple(ingredient_ids),
+                                        frozenset(tags[recipe_id]))
+            for ingredient_id in ingredient_ids:
+                postings = self._postings[ingredient_id]
+                if recipe_ids is None:
+                    # При полной загрузке id рецептов идут по возрастанию.
+                    postings.append(recipe_id)
+                else:
+                    insort(postings, recipe_id)
+
+    def match(self, ingredient_ids, tag_ids=None, min_coverage=0):
+        """Рецепты, отсортированные по доле имеющихся ингредиентов.
+
+        tag_ids=None не ограничивает теги, пустое множество исключает
+        все рецепты. Возвращает список кортежей (id рецепта, доля
+        покрытия, число имеющихся ингредиентов, число ингредиентов
+        рецепта).
+        """
+        self._refresh()
+        matched = Counter()
+        results = []
+        with self._lock:
+            for ingredient_id in set(ingredient_ids):
+                if ingredient_id in self._postings:
+                    matched.update(self._postings[ingredient_id])
+            for recipe_id, count in matched.items():
+                ingredients, tags = self._recipes[recipe_id]
+                if tag_ids is not None and tags.isdisjoint(tag_ids):
+                    continue
+                coverage = count / len(ingredients)
+                if coverage >= min_coverage:
+                    results.append(
+                        (recipe_id, coverage, count, len(ingredients)))
+        results.sort(key=lambda row: (row[1], row[2], row[0]), reverse=True)
+        return results
+
+
+coverage_index = CoverageIndex()
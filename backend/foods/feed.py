@@ -0,0 +1,128 @@
+"""Лента рецептов авторов, на которых подписан пользователь.
+
+Обычно лента читается одним запросом по индексу (author, pub_date, id)
+с фильтром по подпискам. Для пользователей, подписанных больше чем на
+FEED_MAX_FOLLOWED авторов, такой запрос перебирает слишком много
+авторов, поэтому для них ведётся готовая лента FeedEntry: новые и
+изменённые рецепты раскладываются по ней при записи. Ленту, которой
+ещё нет, строит первое чтение, а для всех пользователей сразу —
+команда rebuild_feed_timelines.
+"""
+
+from django.conf import settings
+from django.db.models import Count, OuterRef, Q, Subquery
+
+from .models import FeedEntry, Follow, Recipe
+
+
+def uses_timeline(user):
+    """Ведётся ли для пользователя готовая лента."""
+    return Follow.objects.filter(
+        user=user).count() > settings.FEED_MAX_FOLLOWED
+
+
+def heavy_followers(author_id):
+    """Id подписчиков автора, для которых ведётся готовая лента."""
+    follows = Follow.objects.filter(
+        user=OuterRef('user')
+    ).order_by().values('user').annotate(total=Count('id')).values('total')
+    return Follow.objects.filter(author_id=author_id).annotate(
+        follows=Subquery(follows)
+    ).filter(
+        follows__gt=settings.FEED_MAX_FOLLOWED
+    ).values_list('user_id', flat=True)
+
+
+def followed_recipes(user):
+    """Рецепты авторов, на которых подписан user."""
+    return Recipe.objects.filter(author_id__in=Follow.objects.filter(
+        user=user).values('author_id'))
+
+
+def heavy_users():
+    """Id пользователей, для которых ведётся готовая лента."""
+    return Follow.objects.values('user_id').annotate(
+        total=Count('id')
+    ).filter(
+        total__gt=settings.FEED_MAX_FOLLOWED
+    ).order_by('user_id').values_list('user_id', flat=True)
+
+
+def trim_timeline(user_id):
+    """Удаление из ленты записей старше FEED_TIMELINE_SIZE последних."""
+    size = settings.FEED_TIMELINE_SIZE
+    cutoff = list(FeedEntry.objects.filter(user_id=user_id).order_by(
+        '-pub_date', '-recipe_id'
+    ).values_list('pub_date', 'recipe_id')[size:size + 1])
+    if cutoff:
+        pub_date, recipe_id = cutoff[0]
+        FeedEntry.objects.filter(
+            Q(pub_date__lt=pub_date)
+            | Q(pub_date=pub_date, recipe_id__lte=recipe_id),
+            user_id=user_id).delete()
+
+
+def fill_timeline(user, author_ids=None):
+    """Добавление в ленту user последних рецептов авторов.
+
+    Без author_ids берутся все подписки: так лента создаётся, когда
+    число подписок превышает порог. В ленту попадает не больше
+    FEED_TIMELINE_SIZE рецептов, более старые в ней не видны.
+    """
+    recipes = followed_recipes(user)
+    if author_ids is not None:
+        recipes = recipes.filter(author_id__in=author_ids)
+    latest = recipes.order_by('-pub_date', '-id').values_list(
+        'id', 'pub_date')[:settings.FEED_TIMELINE_SIZE]
+    FeedEntry.objects.bulk_create(
+        (FeedEntry(user=user, recipe_id=recipe_id, pub_date=pub_date)
+         for recipe_id, pub_date in latest),
+        ignore_conflicts=True)
+    if author_ids is not None:
+        trim_timeline(user.pk)
+
+
+def ensure_timeline(user):
+    """Построение готовой ленты, если её у пользователя ещё нет.
+
+    Так лента появляется у тех, кто превысил порог подписок в обход
+    API или после уменьшения FEED_MAX_FOLLOWED.
+    """
+    if not FeedEntry.objects.filter(user=user).exists():
+        fill_timeline(user)
+
+
+def recipe_published(recipe_id):
+    """Раскладка нового или изменённого рецепта по готовым лентам."""
+    recipe = Recipe.objects.filter(pk=recipe_id).values(
+        'author_id', 'pub_date').first()
+    if recipe is None:
+        return
+    FeedEntry.objects.filter(recipe_id=recipe_id).update(
+        pub_date=recipe['pub_date'])
+    user_ids = list(heavy_followers(recipe['author_id']))
+    FeedEntry.objects.bulk_create(
+        (FeedEntry(user_id=user_id, recipe_id=recipe_id,
+                   pub_date=recipe['pub_date'])
+         for user_id in user_ids),
+        ignore_conflicts=True)
+    for user_id in user_ids:
+        trim_timeline(user_id)
+
+
+def followed(user, author_id):
+    """Обновление готовой ленты после подписки на автора."""
+    total = Follow.objects.filter(user=user).count()
+    if total == settings.FEED_MAX_FOLLOWED + 1:
+        fill_timeline(user)
+    elif total > settings.FEED_MAX_FOLLOWED:
+        fill_timeline(user, [author_id])
+
+
+def unfollowed(user, author_id):
+    """Обновление готовой ленты после отписки от автора."""
+    if uses_timeline(user):
+        FeedEntry.objects.filter(
+            user=user, recipe__author_id=author_id).delete()
+    else:
+        FeedEntry.objects.filter(user=user).delete()
@@ -3,6 +3,7 @@
 from django_filters.rest_framework import FilterSet, filters
 
 from .models import Ingredients, Recipe, Tag
+from .search import search_recipes
 
 
 class RecipeFilter(FilterSet):
@@ -19,6 +20,13 @@ class RecipeFilter(FilterSet):
     is_in_shopping_cart = filters.BooleanFilter(
         method='get_is_in_shopping_cart'
     )
+    search = filters.CharFilter(
+        method='get_search'
+    )
+    ordering = filters.OrderingFilter(
+        fields=('favorites_count', 'pub_date'),
+        method='get_ordering'
+    )
 
     class Meta:
         """Метаданные."""
@@ -26,6 +34,19 @@ class RecipeFilter(FilterSet):
         model = Recipe
         fields = ('author', 'tags', 'is_favorited', 'is_in_shopping_cart')
 
+    def get_search(self, queryset, name, value):
+        """Полнотекстовый поиск с сортировкой по рангу."""
+        if not value.strip():
+            return queryset
+        return search_recipes(queryset, value)
+
+    def get_ordering(self, queryset, name, value):
+        """Сортировка с id для устойчивого порядка при равных значениях."""
+        if not value:
+            return queryset
+        direction = '-' if value[-1].startswith('-') else ''
+        return queryset.order_by(*value, f'{direction}id')
+
     def get_is_favorited(self, queryset, name, value):
         """Фильтрация по избранным."""
         if self.request.user.is_authenticated and value:
@@ -0,0 +1,111 @@
+"""Приём изображений: base64, multipart и двоичное тело запроса."""
+
+import binascii
+import io
+import mimetypes
+import os
+import tempfile
+import weakref
+
+import pybase64
+from django.conf import settings
+from django.core.files.uploadedfile import InMemoryUploadedFile, UploadedFile
+from PIL import Image
+from rest_framework import serializers
+
+# Кратно 4, чтобы каждый кусок декодировался независимо.
+DECODE_CHUNK_SIZE = 256 * 1024
+
+
+def image_extension(content_type):
+    """Расширение файла по MIME-типу изображения."""
+    extension = mimetypes.guess_extension(content_type) or ''
+    return extension.lstrip('.') or content_type.rsplit('/', 1)[-1]
+
+
+def remove_file(path):
+    """Удаление файла, если его ещё не переместило хранилище."""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+class DecodedTemporaryFile(UploadedFile):
+    """Декодированное изображение во временном файле на диске.
+
+    Хранилище перемещает файл по temporary_file_path, а оставшийся
+    файл удаляется вместе с объектом, если сохранения не было.
+    """
+
+    def __init__(self, name, content_type, size):
+        """Создание пустого временного файла."""
+        file = tempfile.NamedTemporaryFile(
+            suffix='.upload' + os.path.splitext(name)[1],
+            dir=settings.FILE_UPLOAD_TEMP_DIR, delete=False)
+        super().__init__(file, name, content_type, size)
+        weakref.finalize(self, remove_file, file.name)
+
+    def temporary_file_path(self):
+        """Путь к временному файлу."""
+        return self.file.name
+
+
+def decode_base64_image(data):
+    """Потоковое декодирование data URI во временный файл.
+
+    Размер проверяется по длине строки до декодирования, а сама строка
+    декодируется кусками, поэтому в памяти не появляется вторая полная
+    копия изображения. Файлы больше FILE_UPLOAD_MAX_MEMORY_SIZE пишутся
+    на диск, как при обычной загрузке.
+    """
+    header, _, encoded = data.partition(';base64,')
+    content_type = header[len('data:'):]
+    if not encoded:
+        raise serializers.ValidationError('Некорректные данные изображения.')
+    size = len(encoded) // 4 * 3
+    if size > settings.IMAGE_UPLOAD_MAX_SIZE:
+        raise serializers.ValidationError(
+            'Размер изображения превышает '
+            f'{settings.IMAGE_UPLOAD_MAX_SIZE} байт.')
+
+    name = f'image.{image_extension(content_type)}'
+    if size > settings.FILE_UPLOAD_MAX_MEMORY_SIZE:
+        upload = DecodedTemporaryFile(name, content_type, size)
+    else:
+        upload = InMemoryUploadedFile(io.BytesIO(), None, name,
+                                      content_type, size, None)
+    try:
+        for start in range(0, len(encoded), DECODE_CHUNK_SIZE):
+            upload.file.write(pybase64.b64decode(
+                encoded[start:start + DECODE_CHUNK_SIZE], validate=True))
+    except (binascii.Error, ValueError):
+        raise serializers.ValidationError('Некорректные данные изображения.')
+    upload.size = upload.file.tell()
+    upload.file.seek(0)
+    return upload
+
+
+def check_image(upload):
+    """Проверка размера файла и числа пикселей до полного декодирования.
+
+    Image.open читает только заголовок, поэтому изображение-бомба,
+    сжатое в несколько килобайт, отклоняется до распаковки.
+    """
+    if upload.size > settings.IMAGE_UPLOAD_MAX_SIZE:
+        raise serializers.ValidationError(
+            'Размер изображения превышает '
+            f'{settings.IMAGE_UPLOAD_MAX_SIZE} байт.')
+    try:
+        with Image.open(upload) as image:
+            pixels = image.width * image.height
+    except Image.DecompressionBombError:
+        pixels = None
+    except Exception:
+        # Формат проверит ImageField при полном разборе.
+        pixels = 0
+    finally:
+        upload.seek(0)
+    if pixels is None or pixels > settings.IMAGE_MAX_PIXELS:
+        raise serializers.ValidationError(
+            'Изображение содержит слишком много пикселей.')
@@ -0,0 +1,84 @@
+"""Индекс ингредиентов в памяти процесса для автодополнения."""
+
+import threading
+from bisect import bisect_left
+
+from .models import Ingredients
+from .stamps import bump_stamp, get_stamp
+
+STAMP_NAME = 'ingredients'
+
+
+def normalize(value):
+    """Приведение строки к виду для сравнения без учёта регистра и ё."""
+    return value.casefold().replace('ё', 'е')
+
+
+class IngredientIndex:
+    """Отсортированный массив названий ингредиентов.
+
+    Индекс строится при первом обращении и перестраивается, когда
+    меняется версия в ChangeStamp. Версию меняют сигналы модели
+    Ingredients и команда import_ingredients, и все процессы узнают об
+    изменениях одним запросом по первичному ключу.
+    """
+
+    def __init__(self):
+        """Создание пустого индекса."""
+        self._lock = threading.Lock()
+        self._version = None
+        self._keys = []
+        self._items = []
+        self._all = []
+
+    def version(self):
+        """Текущая версия каталога ингредиентов."""
+        return get_stamp(STAMP_NAME)
+
+    def invalidate(self):
+        """Пометка индекса устаревшим во всех процессах."""
+        bump_stamp(STAMP_NAME)
+        self._version = None
+
+    def _refresh(self):
+        """Перестроение индекса, если версия в кэше изменилась."""
+        version = self.version()
+        if version == self._version:
+            return
+        with self._lock:
+            if version == self._version:
+                return
+            items = [
+                {'id': pk, 'name': name, 'measurement_unit': unit}
+                for pk, name, unit in Ingredients.objects.order_by(
+                    'id').values_list('id', 'name', 'measurement_unit')
+            ]
+            ordered = sorted(items, key=lambda item: (
+                normalize(item['name']), item['id']))
+            self._keys = [normalize(item['name']) for item in ordered]
+            self._items = ordered
+            self._all = items
+            self._version = version
+
+    def all(self):
+        """Все ингредиенты в порядке добавления."""
+        self._refresh()
+        return self._all
+
+    def search(self, query):
+        """Ингредиенты, начинающиеся с query, затем содержащие query."""
+        self._refresh()
+        prefix = normalize(query)
+        if not prefix:
+            return self._all
+        keys, items = self._keys, self._items
+        start = bisect_left(keys, prefix)
+        end = bisect_left(keys, prefix + chr(0x10FFFF), start)
+        substring = [
+            items[position] for position, key in enumerate(keys)
+            if prefix in key and not key.startswith(prefix)
+        ]
+        return items[start:end] + substring
+
+
+ingredient_index = IngredientIndex()
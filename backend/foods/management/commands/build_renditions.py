@@ -0,0 +1,76 @@
+"""Построение вариантов загруженных изображений."""
+
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.db.models import F
+
+from ...models import Recipe
+from ...renditions import build_renditions
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    """Построение вариантов изображений рецептов и аватаров.
+
+    Обрабатываются объекты, у которых варианты не построены или
+    построены для прежнего файла. С --force варианты строятся заново.
+    Изображения обрабатываются пачками в пуле потоков.
+    """
+
+    help = 'Построение уменьшенных вариантов изображений.'
+
+    def add_arguments(self, parser):
+        """Добавление аргументов к команде."""
+        parser.add_argument('--force',
+                            action='store_true',
+                            help='Перестроить варианты всех изображений.')
+        parser.add_argument('--workers',
+                            type=int,
+                            default=4,
+                            help='Количество потоков.')
+        parser.add_argument('--batch-size',
+                            type=int,
+                            default=500,
+                            help='Количество изображений в одной пачке.')
+
+    def handle(self, *args, **options):
+        """Функция команды управления Django."""
+        targets = (
+            (Recipe, 'image', 'image_rendered'),
+            (User, 'avatar', 'avatar_rendered'),
+        )
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            for model, field, source_field in targets:
+                queryset = model.objects.exclude(
+                    **{f'{field}__isnull': True}).exclude(**{field: ''})
+                if not options['force']:
+                    queryset = queryset.exclude(**{source_field: F(field)})
+                ids = queryset.order_by('id').values_list(
+                    'id', flat=True).iterator()
+                built = 0
+                while True:
+                    batch = list(islice(ids, options['batch_size']))
+                    if not batch:
+                        break
+                    built += sum(executor.map(
+                        lambda pk: self.build(model, pk, field, source_field),
+                        batch))
+                self.stdout.write(
+                    f'{model._meta.verbose_name_plural}: '
+                    f'построены варианты {built} изображений.')
+        self.stdout.write(self.style.SUCCESS('Варианты изображений готовы.'))
+
+    def build(self, model, pk, field, source_field):
+        """Построение вариантов одного изображения в потоке пула."""
+        try:
+            return build_renditions(model, pk, field, source_field)
+        except Exception as error:
+            self.stderr.write(f'{model.__name__} {pk}: {error}')
+            return False
+        finally:
+            connections.close_all()
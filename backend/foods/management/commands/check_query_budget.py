@@ -0,0 +1,276 @@
+"""Проверка количества SQL-запросов эндпоинтов API на разных объёмах."""
+
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.runner import DiscoverRunner
+from django.test.utils import (CaptureQueriesContext,
+                               setup_test_environment,
+                               teardown_test_environment)
+from rest_framework.test import APIClient
+
+from ...coverage import coverage_index
+from ...ingredient_index import ingredient_index
+from ...models import (Favorites, Follow, IngredientRecipe, Ingredients,
+                       Recipe, ShoppingCart, Tag, TagRecipe)
+from ...shortlinks import encode, hit_counter
+
+User = get_user_model()
+
+BATCH_SIZE = 1000
+INGREDIENTS_PER_RECIPE = 5
+AUTHORS = 20
+FOLLOWED_AUTHORS = 10
+BULK_SIZE = 7
+
+# Допустимое количество запросов на один вызов эндпоинта.
+QUERY_BUDGETS = {
+    'recipes-list': 8,
+    'recipes-list-anonymous': 6,
+    'recipes-list-tags': 10,
+    'recipes-list-author': 10,
+    'recipes-list-favorited': 8,
+    'recipes-list-cursor': 7,
+    'recipes-list-popular': 8,
+    'recipes-list-search': 10,
+    'recipes-what-to-cook': 9,
+    'recipes-feed': 5,
+    'recipes-detail': 7,
+    'recipes-get-link': 1,
+    'short-link-redirect': 1,
+    'recipes-favorite-post': 5,
+    'recipes-favorite-delete': 4,
+    'recipes-shopping-cart-post': 10,
+    'recipes-shopping-cart-delete': 9,
+    'recipes-favorite-bulk-post': 5,
+    'recipes-favorite-bulk-delete': 5,
+    'recipes-shopping-cart-bulk-post': 10,
+    'recipes-shopping-cart-bulk-delete': 10,
+    'recipes-download-shopping-cart': 1,
+    'users-list': 6,
+    'users-detail': 4,
+    'users-me': 1,
+    'users-subscriptions': 4,
+    'tags-list': 3,
+    'ingredients-list': 3,
+}
+
+# Запросы поиска по названию и индексы, которые должны их обслуживать.
+INDEX_LOOKUPS = (
+    (Ingredients, 'name__istartswith', 'foods_ingredients_name_upper_like'),
+    (Ingredients, 'name__icontains', 'foods_ingredients_name_upper_trgm'),
+    (Recipe, 'name__istartswith', 'foods_recipe_name_upper_like'),
+    (Recipe, 'name__icontains', 'foods_recipe_name_upper_trgm'),
+)
+
+
+class Command(BaseCommand):
+    """Замер SQL-запросов и времени ответа эндпоинтов API.
+
+    Для каждого объёма данных команда создаёт тестовую базу, наполняет
+    её рецептами и вызывает все эндпоинты. Команда завершается с ошибкой,
+    если количество запросов превышает бюджет или растёт вместе с объёмом.
+    """
+
+    help = 'Проверка бюджета SQL-запросов эндпоинтов API.'
+
+    def add_arguments(self, parser):
+        """Добавление аргументов к команде."""
+        parser.add_argument('--scales',
+                            nargs='+',
+                            type=int,
+                            default=[10, 1000],
+                            help='Количество рецептов для каждого замера.')
+
+    def handle(self, *args, **options):
+        """Функция команды управления Django."""
+        scales = sorted(options['scales'])
+        results = {}
+        for scale in scales:
+            results[scale] = self.measure(scale)
+
+        errors = []
+        baseline = results[scales[0]]
+        for scale in scales:
+            for route, (queries, elapsed) in results[scale].items():
+                self.stdout.write(
+                    f'{scale:>8} {route:<36} {queries:>4} запр. '
+                    f'{elapsed * 1000:>9.1f} мс')
+                if queries > QUERY_BUDGETS[route]:
+                    errors.append(
+                        f'{route}: {queries} запросов при {scale} рецептах, '
+                        f'бюджет {QUERY_BUDGETS[route]}')
+                if queries > baseline[route][0]:
+                    errors.append(
+                        f'{route}: количество запросов растёт с объёмом '
+                        f'({baseline[route][0]} -> {queries})')
+        if errors:
+            raise CommandError('\n'.join(errors))
+        self.stdout.write(self.style.SUCCESS(
+            'Все эндпоинты укладываются в бюджет запросов.'))
+
+    def measure(self, scale):
+        """Замер всех эндпоинтов на тестовой базе с scale рецептами."""
+        setup_test_environment()
+        runner = DiscoverRunner(verbosity=0, interactive=False)
+        old_config = runner.setup_databases()
+        # Кэш ответов и индексы в памяти построены по предыдущей
+        # тестовой базе.
+        cache.clear()
+        ingredient_index.invalidate()
+        coverage_index.invalidate()
+        try:
+            viewer, author, recipe, tag = self.seed(scale)
+            self.check_indexes()
+            return self.run_routes(viewer, author, recipe, tag)
+        finally:
+            # Переходы по ссылкам записываются в тестовую базу.
+            hit_counter.flush()
+            runner.teardown_databases(old_config)
+            teardown_test_environment()
+
+    def seed(self, scale):
+        """Наполнение базы рецептами, подписками, избранным и покупками."""
+        viewer = User.objects.create_user(
+            email='viewer@example.org', username='viewer',
+            password='viewer-password', first_name='Viewer',
+            last_name='Viewer')
+        User.objects.bulk_create(
+            User(email=f'author{i}@example.org', username=f'author{i}',
+                 first_name='Author', last_name=str(i))
+            for i in range(AUTHORS))
+        authors = list(User.objects.exclude(pk=viewer.pk).order_by('id'))
+        Tag.objects.bulk_create(
+            Tag(name=f'Тег {i}', slug=f'tag{i}') for i in range(3))
+        tags = list(Tag.objects.order_by('id'))
+        Ingredients.objects.bulk_create(
+            Ingredients(name=f'ингредиент {i}', measurement_unit='г')
+            for i in range(INGREDIENTS_PER_RECIPE * 10))
+        ingredients = list(Ingredients.objects.order_by('id'))
+
+        Recipe.objects.bulk_create(
+            (Recipe(author=authors[i % len(authors)], name=f'Рецепт {i}',
+                    text='Описание', cooking_time=10,
+                    image='recipes/images/sample.png')
+             for i in range(scale)),
+            batch_size=BATCH_SIZE)
+        recipe_ids = list(Recipe.objects.values_list('id', flat=True))
+        IngredientRecipe.objects.bulk_create(
+            (IngredientRecipe(
+                recipe_id=recipe_id,
+                name=ingredients[(index + offset) % len(ingredients)],
+                amount=offset + 1)
+             for index, recipe_id in enumerate(recipe_ids)
+             for offset in range(INGREDIENTS_PER_RECIPE)),
+            batch_size=BATCH_SIZE)
+        TagRecipe.objects.bulk_create(
+            (TagRecipe(recipe_id=recipe_id, name=tags[index % len(tags)])
+             for index, recipe_id in enumerate(recipe_ids)),
+            batch_size=BATCH_SIZE)
+        liked = recipe_ids[1::2]
+        Favorites.objects.bulk_create(
+            (Favorites(user=viewer, recipe_id=recipe_id)
+             for recipe_id in liked),
+            batch_size=BATCH_SIZE)
+        ShoppingCart.objects.bulk_create(
+            (ShoppingCart(user=viewer, recipe_id=recipe_id)
+             for recipe_id in liked),
+            batch_size=BATCH_SIZE)
+        Follow.objects.bulk_create(
+            Follow(user=viewer, author=followed)
+            for followed in authors[:FOLLOWED_AUTHORS])
+        call_command('rebuild_shopping_lists', stdout=self.stdout)
+        call_command('reconcile_counters', stdout=self.stdout)
+        recipe = Recipe.objects.get(pk=recipe_ids[0])
+        return viewer, authors[0], recipe, tags[0]
+
+    def check_indexes(self):
+        """Проверка через EXPLAIN, что поиск по названию идёт по индексу."""
+        if connection.vendor != 'postgresql':
+            return
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            for model, lookup, index in INDEX_LOOKUPS:
+                plan = model.objects.filter(**{lookup: 'ингр'}).explain()
+                if index not in plan:
+                    raise CommandError(
+                        f'{model.__name__}.{lookup} не использует индекс '
+                        f'{index}:\n{plan}')
+
+    def run_routes(self, viewer, author, recipe, tag):
+        """Вызов эндпоинтов с подсчётом запросов и времени."""
+        client = APIClient()
+        client.force_authenticate(viewer)
+        anonymous = APIClient()
+        bulk = {'recipes': list(Recipe.objects.order_by(
+            'id').values_list('id', flat=True)[:BULK_SIZE])}
+        routes = (
+            ('recipes-list', client, 'get', '/api/recipes/'),
+            ('recipes-list-anonymous', anonymous, 'get', '/api/recipes/'),
+            ('recipes-list-tags', client, 'get',
+             f'/api/recipes/?tags={tag.slug}'),
+            ('recipes-list-author', client, 'get',
+             f'/api/recipes/?author={author.id}'),
+            ('recipes-list-favorited', client, 'get',
+             '/api/recipes/?is_favorited=1&is_in_shopping_cart=1'),
+            ('recipes-list-cursor', client, 'get',
+             '/api/recipes/?pagination=cursor'),
+            ('recipes-list-popular', client, 'get',
+             '/api/recipes/?ordering=-favorites_count'),
+            ('recipes-list-search', client, 'get',
+             '/api/recipes/?search=рецепт ингредиент'),
+            ('recipes-what-to-cook', client, 'get',
+             '/api/recipes/what-to-cook/?ingredients=1&ingredients=2'
+             '&ingredients=3&tags=tag0'),
+            ('recipes-feed', client, 'get', '/api/recipes/feed/'),
+            ('recipes-detail', client, 'get', f'/api/recipes/{recipe.id}/'),
+            ('recipes-get-link', client, 'get',
+             f'/api/recipes/{recipe.id}/get-link/'),
+            ('short-link-redirect', anonymous, 'get',
+             f'/s/{encode(recipe.id)}'),
+            ('recipes-favorite-post', client, 'post',
+             f'/api/recipes/{recipe.id}/favorite/'),
+            ('recipes-favorite-delete', client, 'delete',
+             f'/api/recipes/{recipe.id}/favorite/'),
+            ('recipes-shopping-cart-post', client, 'post',
+             f'/api/recipes/{recipe.id}/shopping_cart/'),
+            ('recipes-shopping-cart-delete', client, 'delete',
+             f'/api/recipes/{recipe.id}/shopping_cart/'),
+            ('recipes-favorite-bulk-post', client, 'post',
+             '/api/recipes/favorite/', bulk),
+            ('recipes-favorite-bulk-delete', client, 'delete',
+             '/api/recipes/favorite/', bulk),
+            ('recipes-shopping-cart-bulk-post', client, 'post',
+             '/api/recipes/shopping_cart/', bulk),
+            ('recipes-shopping-cart-bulk-delete', client, 'delete',
+             '/api/recipes/shopping_cart/', bulk),
+            ('recipes-download-shopping-cart', client, 'get',
+             '/api/recipes/download_shopping_cart/'),
+            ('users-list', client, 'get', '/api/users/'),
+            ('users-detail', client, 'get', f'/api/users/{author.id}/'),
+            ('users-me', client, 'get', '/api/users/me/'),
+            ('users-subscriptions', client, 'get',
+             '/api/users/subscriptions/?recipes_limit=3'),
+            ('tags-list', client, 'get', '/api/tags/'),
+            ('ingredients-list', client, 'get',
+             '/api/ingredients/?name=ингр'),
+        )
+        results = {}
+        for route, route_client, method, url, *data in routes:
+            with CaptureQueriesContext(connection) as context:
+                started = time.perf_counter()
+                response = getattr(route_client, method)(
+                    url, *data, format='json')
+                if getattr(response, 'streaming', False):
+                    b''.join(response.streaming_content)
+                elapsed = time.perf_counter() - started
+            if response.status_code >= 400:
+                raise CommandError(
+                    f'{route}: {method.upper()} {url} вернул '
+                    f'{response.status_code}')
+            results[route] = (len(context), elapsed)
+        return results
@@ -0,0 +1,85 @@
+"""Выгрузка рецептов в NDJSON."""
+
+import json
+import sys
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+
+from ...models import IngredientRecipe, Recipe, TagRecipe
+
+
+class Command(BaseCommand):
+    """Потоковая выгрузка рецептов с ингредиентами и тегами.
+
+    Каждая строка файла - один рецепт: название, описание, время
+    приготовления, путь к изображению, email автора, ингредиенты с
+    количеством и слаги тегов. Рецепты читаются пачками по первичному
+    ключу, поэтому расход памяти не зависит от объёма выгрузки.
+    """
+
+    help = 'Выгрузка рецептов в NDJSON.'
+
+    def add_arguments(self, parser):
+        """Добавление аргументов к команде."""
+        parser.add_argument('output',
+                            type=str,
+                            help='Файл NDJSON или - для stdout.')
+        parser.add_argument('--batch-size',
+                            type=int,
+                            default=1000,
+                            help='Количество рецептов в одной пачке.')
+
+    def handle(self, *args, **options):
+        """Функция команды управления Django."""
+        if options['output'] == '-':
+            total = self.export(sys.stdout, options['batch_size'])
+        else:
+            with open(options['output'], 'w', encoding='utf-8') as output:
+                total = self.export(output, options['batch_size'])
+        self.stderr.write(self.style.SUCCESS(
+            f'Выгружено рецептов: {total}.'))
+
+    def export(self, output, batch_size):
+        """Запись рецептов в output, возвращает их количество."""
+        total = 0
+        last_id = 0
+        while True:
+            recipes = list(Recipe.objects.filter(
+                id__gt=last_id
+            ).order_by('id').values(
+                'id', 'name', 'text', 'cooking_time', 'image',
+                'author__email',
+            )[:batch_size])
+            if not recipes:
+                return total
+            last_id = recipes[-1]['id']
+            ids = [recipe['id'] for recipe in recipes]
+
+            ingredients = defaultdict(list)
+            rows = IngredientRecipe.objects.filter(
+                recipe_id__in=ids
+            ).order_by('id').values_list(
+                'recipe_id', 'name__name', 'name__measurement_unit', 'amount')
+            for recipe_id, name, unit, amount in rows:
+                ingredients[recipe_id].append(
+                    {'name': name, 'measurement_unit': unit,
+                     'amount': amount})
+            tags = defaultdict(list)
+            for recipe_id, slug in TagRecipe.objects.filter(
+                recipe_id__in=ids
+            ).order_by('id').values_list('recipe_id', 'name__slug'):
+                tags[recipe_id].append(slug)
+
+            output.writelines(
+                json.dumps({
+                    'name': recipe['name'],
+                    'text': recipe['text'],
+                    'cooking_time': recipe['cooking_time'],
+                    'image': recipe['image'] or None,
+                    'author': recipe['author__email'],
+                    'ingredients': ingredients[recipe['id']],
+                    'tags': tags[recipe['id']],
+                }, ensure_ascii=False) + '\n'
+                for recipe in recipes)
+            total += len(recipes)
@@ -1,34 +1,185 @@
 """Загрузка данных ингредиентов в таблицу."""
 
 import csv
+import io
+import json
+import time
+from itertools import islice
 
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
 
+from ...ingredient_index import ingredient_index
 from ...models import Ingredients
 
+READ_CHUNK_SIZE = 64 * 1024
+SEPARATORS = ' \t\r\n[],'
+
+
+def read_csv(path):
+    """Построчное чтение ингредиентов из CSV-файла."""
+    with open(path, encoding='utf-8', newline='') as f:
+        for row in csv.reader(f):
+            if row:
+                name, measurement_unit = row
+                yield name.strip(), measurement_unit.strip()
+
+
+def read_json(path):
+    """Потоковое чтение ингредиентов из JSON-массива или NDJSON."""
+    decoder = json.JSONDecoder()
+    buffer = ''
+    position = 0
+    with open(path, encoding='utf-8') as f:
+        while True:
+            while position < len(buffer) and buffer[position] in SEPARATORS:
+                position += 1
+            try:
+                if position == len(buffer):
+                    raise ValueError
+                item, position = decoder.raw_decode(buffer, position)
+            except ValueError:
+                chunk = f.read(READ_CHUNK_SIZE)
+                if not chunk:
+                    if position < len(buffer):
+                        raise CommandError(
+                            f'Некорректный JSON: {buffer[position:][:50]}')
+                    return
+                buffer = buffer[position:] + chunk
+                position = 0
+                continue
+            yield item['name'].strip(), item['measurement_unit'].strip()
+
+
+READERS = {
+    'csv': read_csv,
+    'json': read_json,
+}
+
 
 class Command(BaseCommand):
-    """Импорт данных ингредиентов из CSV-файла."""
+    """Импорт данных ингредиентов из CSV- или JSON-файла."""
 
-    help = 'Импорт данных ингредиентов из CSV-файла.'
+    help = 'Импорт данных ингредиентов из CSV- или JSON-файла.'
 
     def add_arguments(self, parser):
         """Добавление аргумента к команде."""
         parser.add_argument('csv_file',
                             type=str,
-                            help='CSV-файл с данными ингредиентов.')
+                            help='CSV- или JSON-файл с данными ингредиентов.')
+        parser.add_argument('--format',
+                            choices=tuple(READERS),
+                            help='Формат файла, по умолчанию по расширению.')
+        parser.add_argument('--batch-size',
+                            type=int,
+                            default=1000,
+                            help='Количество строк в одной пачке.')
+        parser.add_argument('--update',
+                            action='store_true',
+                            help='Обновлять единицы измерения существующих '
+                                 'ингредиентов вместо пропуска.')
+        parser.add_argument('--no-copy',
+                            action='store_true',
+                            help='Не использовать COPY на PostgreSQL.')
 
     def handle(self, *args, **options):
         """Функция команды управления Django."""
-        csv_file = options['csv_file']
+        path = options['csv_file']
+        file_format = options['format'] or path.rsplit('.', 1)[-1].lower()
+        if file_format not in READERS:
+            raise CommandError(f'Неизвестный формат файла: {file_format}')
+        if options['batch_size'] < 1:
+            raise CommandError('Размер пачки должен быть положительным.')
 
-        with open(csv_file, 'r') as f:
-            reader = csv.reader(f)
-            for row in reader:
-                name, measurement_unit = row
-                Ingredients.objects.get_or_create(
-                    name=name,
-                    measurement_unit=measurement_unit)
+        rows = READERS[file_format](path)
+        if connection.vendor == 'postgresql' and not options['no_copy']:
+            import_batch = self.import_batch_copy
+        else:
+            import_batch = self.import_batch_orm
+
+        self.stats = {'inserted': 0, 'updated': 0, 'skipped': 0}
+        total = 0
+        started = time.monotonic()
+        while True:
+            batch = list(islice(rows, options['batch_size']))
+            if not batch:
+                break
+            total += len(batch)
+            with transaction.atomic():
+                import_batch(batch, options['update'])
+        elapsed = time.monotonic() - started
+        ingredient_index.invalidate()
 
+        self.stdout.write(
+            f'Обработано строк: {total} за {elapsed:.2f} с '
+            f'({total / elapsed if elapsed else total:.0f} строк/с). '
+            f'Добавлено: {self.stats["inserted"]}, '
+            f'обновлено: {self.stats["updated"]}, '
+            f'пропущено: {self.stats["skipped"]}.')
         self.stdout.write(self.style.SUCCESS(
             'Данные ингредиентов успешно импортированы.'))
+
+    def import_batch_orm(self, batch, update):
+        """Загрузка пачки через bulk_create и bulk_update."""
+        units = dict(batch)
+        self.stats['skipped'] += len(batch) - len(units)
+        existing = Ingredients.objects.in_bulk(units, field_name='name')
+
+        Ingredients.objects.bulk_create(
+            (Ingredients(name=name, measurement_unit=unit)
+             for name, unit in units.items() if name not in existing),
+            ignore_conflicts=True)
+        self.stats['inserted'] += len(units) - len(existing)
+
+        changed = []
+        for name, ingredient in existing.items():
+            if update and ingredient.measurement_unit != units[name]:
+                ingredient.measurement_unit = units[name]
+                changed.append(ingredient)
+        Ingredients.objects.bulk_update(changed, ('measurement_unit',))
+        self.stats['updated'] += len(changed)
+        self.stats['skipped'] += len(existing) - len(changed)
+
+    def import_batch_copy(self, batch, update):
+        """Загрузка пачки через COPY во временную таблицу PostgreSQL.
+
+        Номер строки в пачке нужен, чтобы из повторов одного названия,
+        как и в import_batch_orm, побеждала последняя строка.
+        """
+        table = connection.ops.quote_name(Ingredients._meta.db_table)
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(
+            (ordinal, name, unit)
+            for ordinal, (name, unit) in enumerate(batch))
+        buffer.seek(0)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'CREATE TEMP TABLE ingredients_staging '
+                '(ordinal integer, name varchar(255), '
+                ' measurement_unit varchar(255)) '
+                'ON COMMIT DROP')
+            cursor.copy_expert(
+                'COPY ingredients_staging FROM STDIN WITH (FORMAT csv)',
+                buffer)
+            updated = 0
+            if update:
+                cursor.execute(
+                    f'UPDATE {table} AS i '
+                    'SET measurement_unit = s.measurement_unit '
+                    'FROM (SELECT DISTINCT ON (name) name, measurement_unit '
+                    '      FROM ingredients_staging '
+                    '      ORDER BY name, ordinal DESC) AS s '
+                    'WHERE i.name = s.name '
+                    'AND i.measurement_unit <> s.measurement_unit')
+                updated = cursor.rowcount
+            cursor.execute(
+                f'INSERT INTO {table} (name, measurement_unit) '
+                'SELECT DISTINCT ON (name) name, measurement_unit '
+                'FROM ingredients_staging AS s '
+                f'WHERE NOT EXISTS (SELECT 1 FROM {table} AS i '
+                '                   WHERE i.name = s.name) '
+                'ORDER BY name, ordinal DESC')
+            inserted = cursor.rowcount
+        self.stats['inserted'] += inserted
+        self.stats['updated'] += updated
+        self.stats['skipped'] += len(batch) - inserted - updated
@@ -0,0 +1,221 @@
+"""Загрузка рецептов из NDJSON."""
+
+import json
+import os
+import time
+from collections import Counter
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from ...cache import bump_content_version
+from ...counters import change_recipes_count
+from ...coverage import coverage_index
+from ...ingredient_index import ingredient_index
+from ...models import IngredientRecipe, Ingredients, Recipe, Tag, TagRecipe
+from ...search import update_search_vectors
+
+User = get_user_model()
+
+
+def read_checkpoint(path):
+    """Количество строк, загруженных при прошлом запуске."""
+    try:
+        with open(path, encoding='utf-8') as f:
+            return int(f.read().strip() or 0)
+    except FileNotFoundError:
+        return 0
+
+
+def write_checkpoint(path, lines):
+    """Атомарная запись количества загруженных строк."""
+    temporary = f'{path}.tmp'
+    with open(temporary, 'w', encoding='utf-8') as f:
+        f.write(str(lines))
+    os.replace(temporary, path)
+
+
+class Command(BaseCommand):
+    """Потоковая загрузка рецептов, выгруженных export_recipes.
+
+    Файл читается пачками строк. Ингредиенты и теги сопоставляются по
+    названию и слагу через словари в памяти, недостающие ингредиенты
+    создаются. Рецепты и связи пишутся через bulk_create, каждая пачка
+    в своей транзакции. После пачки в файл контрольной точки
+    записывается число обработанных строк, и повторный запуск
+    продолжает с него. Уже существующие рецепты автора с тем же
+    названием пропускаются. Повторы ингредиента в одном рецепте
+    объединяются с суммой количеств, повторы тега отбрасываются.
+    """
+
+    help = 'Загрузка рецептов из NDJSON.'
+
+    def add_arguments(self, parser):
+        """Добавление аргументов к команде."""
+        parser.add_argument('input',
+                            type=str,
+                            help='Файл NDJSON от export_recipes.')
+        parser.add_argument('--batch-size',
+                            type=int,
+                            default=1000,
+                            help='Количество рецептов в одной пачке.')
+        parser.add_argument('--checkpoint',
+                            type=str,
+                            help='Файл контрольной точки, по умолчанию '
+                                 '<input>.checkpoint.')
+
+    def handle(self, *args, **options):
+        """Функция команды управления Django."""
+        if options['batch_size'] < 1:
+            raise CommandError('Размер пачки должен быть положительным.')
+        checkpoint = options['checkpoint'] or f'{options["input"]}.checkpoint'
+        done = read_checkpoint(checkpoint)
+
+        self.ingredients = {
+            name: pk for pk, name in Ingredients.objects.values_list(
+                'id', 'name')}
+        self.tags = dict(Tag.objects.values_list('slug', 'id'))
+        self.authors = {}
+        self.stats = Counter()
+        started = time.monotonic()
+        with open(options['input'], encoding='utf-8') as f:
+            lines = enumerate(islice(f, done, None), start=done + 1)
+            while True:
+                batch = list(islice(lines, options['batch_size']))
+                if not batch:
+                    break
+                with transaction.atomic():
+                    self.import_batch(batch)
+                done = batch[-1][0]
+                write_checkpoint(checkpoint, done)
+        if os.path.exists(checkpoint):
+            os.remove(checkpoint)
+        bump_content_version()
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(
+            f'Обработано строк: {done} за {elapsed:.2f} с. '
+            f'Добавлено рецептов: {self.stats["created"]}, '
+            f'пропущено существующих: {self.stats["exists"]}, '
+            f'без автора: {self.stats["no_author"]}, '
+            f'неизвестных тегов: {self.stats["no_tag"]}, '
+            f'объединено повторов ингредиентов: {self.stats["merged"]}, '
+            f'новых ингредиентов: {self.stats["new_ingredients"]}.')
+        self.stdout.write(self.style.SUCCESS(
+            'Рецепты загружены. Варианты изображений строит '
+            'команда build_renditions.'))
+
+    def parse(self, batch):
+        """Разбор строк пачки в словари рецептов."""
+        items = []
+        for number, line in batch:
+            if not line.strip():
+                continue
+            try:
+                items.append(json.loads(line))
+            except ValueError as error:
+                raise CommandError(f'Строка {number}: {error}')
+        return items
+
+    def resolve_authors(self, items):
+        """Загрузка id авторов пачки, которых ещё нет в словаре."""
+        emails = {item['author'] for item in items} - set(self.authors)
+        if emails:
+            self.authors.update(User.objects.filter(
+                email__in=emails).values_list('email', 'id'))
+            # Отсутствующих авторов запоминаем, чтобы не искать снова.
+            self.authors.update(
+                (email, None) for email in emails - set(self.authors))
+
+    def resolve_ingredients(self, items):
+        """Создание ингредиентов пачки, которых нет в словаре.
+
+        bulk_create не отправляет сигналы, поэтому версия каталога
+        ингредиентов меняется здесь, в транзакции пачки.
+        """
+        missing = {}
+        for item in items:
+            for ingredient in item['ingredients']:
+                if ingredient['name'] not in self.ingredients:
+                    missing[ingredient['name']] = (
+                        ingredient['measurement_unit'])
+        if missing:
+            Ingredients.objects.bulk_create(
+                (Ingredients(name=name, measurement_unit=unit)
+                 for name, unit in missing.items()),
+                ignore_conflicts=True)
+            self.ingredients.update(Ingredients.objects.filter(
+                name__in=missing).values_list('name', 'id'))
+            self.stats['new_ingredients'] += len(missing)
+            ingredient_index.invalidate()
+
+    def ingredient_amounts(self, item):
+        """Количества ингредиентов рецепта по id, повторы складываются."""
+        amounts = Counter()
+        for ingredient in item['ingredients']:
+            amounts[self.ingredients[ingredient['name']]] += (
+                ingredient['amount'])
+        self.stats['merged'] += len(item['ingredients']) - len(amounts)
+        return amounts
+
+    def import_batch(self, batch):
+        """Загрузка пачки рецептов со связями."""
+        items = self.parse(batch)
+        self.resolve_authors(items)
+        self.resolve_ingredients(items)
+
+        candidates = {}
+        for item in items:
+            author_id = self.authors[item['author']]
+            if author_id is None:
+                self.stats['no_author'] += 1
+            elif (author_id, item['name']) in candidates:
+                self.stats['exists'] += 1
+            else:
+                candidates[(author_id, item['name'])] = item
+        existing = set(Recipe.objects.filter(
+            author_id__in={author_id for author_id, _ in candidates},
+            name__in={name for _, name in candidates},
+        ).values_list('author_id', 'name'))
+        self.stats['exists'] += len(existing & set(candidates))
+        new = [(key, item) for key, item in candidates.items()
+               if key not in existing]
+
+        recipes = [
+            Recipe(author_id=author_id, name=name, text=item['text'],
+                   cooking_time=item['cooking_time'],
+                   image=item.get('image') or None)
+            for (author_id, name), item in new
+        ]
+        if connection.features.can_return_rows_from_bulk_insert:
+            Recipe.objects.bulk_create(recipes)
+        else:
+            for recipe in recipes:
+                recipe.save()
+
+        IngredientRecipe.objects.bulk_create(
+            IngredientRecipe(recipe=recipe, name_id=ingredient_id,
+                             amount=amount)
+            for recipe, (_, item) in zip(recipes, new)
+            for ingredient_id, amount in self.ingredient_amounts(
+                item).items())
+        tag_rows = []
+        for recipe, (_, item) in zip(recipes, new):
+            for slug in dict.fromkeys(item['tags']):
+                if slug in self.tags:
+                    tag_rows.append(TagRecipe(recipe=recipe,
+                                              name_id=self.tags[slug]))
+                else:
+                    self.stats['no_tag'] += 1
+        TagRecipe.objects.bulk_create(tag_rows)
+        recipe_ids = [recipe.pk for recipe in recipes]
+        update_search_vectors(recipe_ids)
+        transaction.on_commit(
+            lambda: coverage_index.mark_changed(recipe_ids))
+
+        for author_id, count in Counter(
+                author_id for (author_id, _), _ in new).items():
+            change_recipes_count(author_id, count)
+        self.stats['created'] += len(recipes)
@@ -0,0 +1,45 @@
+"""Построение готовых лент подписок."""
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from ...feed import fill_timeline, heavy_users, trim_timeline
+from ...models import FeedEntry
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    """Построение лент FeedEntry для пользователей с большим числом подписок.
+
+    Команда нужна после развёртывания, изменения FEED_MAX_FOLLOWED и
+    подписок, созданных в обход API. Ленты пользователей, подписанных
+    не больше чем на FEED_MAX_FOLLOWED авторов, удаляются.
+    """
+
+    help = 'Построение готовых лент подписок.'
+
+    def add_arguments(self, parser):
+        """Добавление аргументов к команде."""
+        parser.add_argument('--batch-size',
+                            type=int,
+                            default=100,
+                            help='Количество пользователей в одной пачке.')
+
+    def handle(self, *args, **options):
+        """Функция команды управления Django."""
+        user_ids = list(heavy_users())
+        deleted, _ = FeedEntry.objects.exclude(
+            user_id__in=user_ids).delete()
+        batch_size = options['batch_size']
+        for start in range(0, len(user_ids), batch_size):
+            users = User.objects.filter(
+                pk__in=user_ids[start:start + batch_size]).only('id')
+            for user in users:
+                with transaction.atomic():
+                    fill_timeline(user)
+                    trim_timeline(user.pk)
+        self.stdout.write(self.style.SUCCESS(
+            f'Лент построено: {len(user_ids)}, '
+            f'удалено лишних записей: {deleted}.'))
@@ -0,0 +1,46 @@
+"""Пересчёт сохранённых списков покупок."""
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+
+from ...shopping_list import rebuild_shopping_lists
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    """Сверка ShoppingListItem с содержимым корзин и исправление расхождений.
+
+    Пользователи обрабатываются пачками: для каждой пачки суммы
+    ингредиентов считаются одним агрегирующим запросом и сравниваются
+    с сохранёнными строками.
+    """
+
+    help = 'Пересчёт и проверка сохранённых списков покупок.'
+
+    def add_arguments(self, parser):
+        """Добавление аргументов к команде."""
+        parser.add_argument('--verify',
+                            action='store_true',
+                            help='Только проверить, не исправляя.')
+        parser.add_argument('--batch-size',
+                            type=int,
+                            default=500,
+                            help='Количество пользователей в одной пачке.')
+
+    def handle(self, *args, **options):
+        """Функция команды управления Django."""
+        user_ids = list(User.objects.filter(
+            Q(carts__isnull=False) | Q(shopping_list__isnull=False)
+        ).distinct().order_by('id').values_list('id', flat=True))
+        batch_size = options['batch_size']
+        mismatches = 0
+        for start in range(0, len(user_ids), batch_size):
+            mismatches += rebuild_shopping_lists(
+                user_ids[start:start + batch_size], options['verify'])
+
+        if options['verify'] and mismatches:
+            raise CommandError(f'Найдено расхождений: {mismatches}.')
+        self.stdout.write(self.style.SUCCESS(
+            f'Списки покупок проверены, расхождений: {mismatches}.'))
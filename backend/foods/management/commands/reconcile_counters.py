@@ -0,0 +1,73 @@
+"""Сверка счётчиков избранного и рецептов."""
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count
+
+from ...models import Favorites, Recipe
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    """Сверка Recipe.favorites_count и User.recipes_count с данными.
+
+    Счётчики расходятся после изменений в обход моделей и их сигналов:
+    bulk_create, update() и сырого SQL, загрузки данных. Строки
+    обрабатываются пачками по первичному ключу: для каждой пачки
+    фактические значения считаются одним агрегирующим запросом.
+    """
+
+    help = 'Пересчёт и проверка счётчиков избранного и рецептов.'
+
+    def add_arguments(self, parser):
+        """Добавление аргументов к команде."""
+        parser.add_argument('--verify',
+                            action='store_true',
+                            help='Только проверить, не исправляя.')
+        parser.add_argument('--batch-size',
+                            type=int,
+                            default=1000,
+                            help='Количество строк в одной пачке.')
+
+    def handle(self, *args, **options):
+        """Функция команды управления Django."""
+        counters = (
+            (Recipe, 'favorites_count', Favorites, 'recipe'),
+            (User, 'recipes_count', Recipe, 'author'),
+        )
+        mismatches = 0
+        for model, field, related, foreign_key in counters:
+            ids = list(model.objects.order_by('id').values_list(
+                'id', flat=True))
+            for start in range(0, len(ids), options['batch_size']):
+                mismatches += self.process(
+                    ids[start:start + options['batch_size']], model, field,
+                    related, foreign_key, options['verify'])
+
+        if options['verify'] and mismatches:
+            raise CommandError(f'Найдено расхождений: {mismatches}.')
+        self.stdout.write(self.style.SUCCESS(
+            f'Счётчики проверены, расхождений: {mismatches}.'))
+
+    def process(self, ids, model, field, related, foreign_key, verify):
+        """Сверка и исправление счётчика field пачки объектов model."""
+        with transaction.atomic():
+            # Строки блокируются до подсчёта: изменения, закоммиченные
+            # позже, применят свой F() уже поверх исправленного значения.
+            objs = list(model.objects.select_for_update().filter(
+                id__in=ids).only('id', field))
+            expected = dict(related.objects.filter(
+                **{f'{foreign_key}_id__in': ids}
+            ).values_list(foreign_key).annotate(
+                total=Count('id')).order_by())
+            changed = []
+            for obj in objs:
+                total = expected.get(obj.id, 0)
+                if getattr(obj, field) != total:
+                    setattr(obj, field, total)
+                    changed.append(obj)
+            if not verify:
+                model.objects.bulk_update(changed, (field,))
+        return len(changed)
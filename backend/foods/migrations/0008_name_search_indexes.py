@@ -0,0 +1,46 @@
+from django.db import migrations
+
+# Выражение UPPER("name"::text) совпадает с тем, что Django генерирует для
+# istartswith/icontains на PostgreSQL, поэтому планировщик может
+# использовать эти индексы без изменения запросов.
+INDEXES = (
+    ('foods_ingredients_name_upper_like', 'foods_ingredients',
+     'btree (UPPER("name"::text) text_pattern_ops)'),
+    ('foods_ingredients_name_upper_trgm', 'foods_ingredients',
+     'gin (UPPER("name"::text) gin_trgm_ops)'),
+    ('foods_recipe_name_upper_like', 'foods_recipe',
+     'btree (UPPER("name"::text) text_pattern_ops)'),
+    ('foods_recipe_name_upper_trgm', 'foods_recipe',
+     'gin (UPPER("name"::text) gin_trgm_ops)'),
+)
+
+
+def create_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for name, table, definition in INDEXES:
+        schema_editor.execute(
+            f'CREATE INDEX CONCURRENTLY IF NOT EXISTS "{name}" '
+            f'ON "{table}" USING {definition}'
+        )
+
+
+def drop_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, _, _ in INDEXES:
+        schema_editor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS "{name}"')
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('foods', '0007_follow'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
@@ -0,0 +1,52 @@
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Sum
+import django.db.models.deletion
+
+BATCH_SIZE = 1000
+
+
+def fill_shopping_lists(apps, schema_editor):
+    ShoppingCart = apps.get_model('foods', 'ShoppingCart')
+    ShoppingListItem = apps.get_model('foods', 'ShoppingListItem')
+    totals = ShoppingCart.objects.filter(
+        recipe__ingredientrecipe__isnull=False
+    ).values(
+        'user', 'recipe__ingredientrecipe__name'
+    ).annotate(
+        total=Sum('recipe__ingredientrecipe__amount')
+    ).order_by().iterator()
+    batch = []
+    for row in totals:
+        batch.append(ShoppingListItem(user_id=row['user'],
+                                      ingredient_id=row['recipe__ingredientrecipe__name'],
+                                      amount=row['total']))
+        if len(batch) == BATCH_SIZE:
+            ShoppingListItem.objects.bulk_create(batch)
+            batch = []
+    ShoppingListItem.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('foods', '0008_name_search_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShoppingListItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.IntegerField(verbose_name='Количество')),
+                ('ingredient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='foods.ingredients', verbose_name='Ингредиент')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shopping_list', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='shoppinglistitem',
+            constraint=models.UniqueConstraint(fields=('user', 'ingredient'), name='unique_shopping_list_item'),
+        ),
+        migrations.RunPython(fill_shopping_lists, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,48 @@
+from django.db import migrations, models
+
+
+def add_pub_date(apps, schema_editor):
+    """Добавление столбца pub_date, если его ещё нет в таблице."""
+    Recipe = apps.get_model('foods', 'Recipe')
+    connection = schema_editor.connection
+    with connection.cursor() as cursor:
+        columns = {
+            column.name for column in
+            connection.introspection.get_table_description(
+                cursor, Recipe._meta.db_table)
+        }
+    if 'pub_date' not in columns:
+        field = models.DateTimeField(auto_now=True)
+        field.set_attributes_from_name('pub_date')
+        schema_editor.add_field(Recipe, field)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foods', '0009_shoppinglistitem'),
+    ]
+
+    operations = [
+        # Поле pub_date было добавлено в модель без миграции.
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunPython(add_pub_date, migrations.RunPython.noop),
+            ],
+            state_operations=[
+                migrations.AddField(
+                    model_name='recipe',
+                    name='pub_date',
+                    field=models.DateTimeField(auto_now=True, verbose_name='Дата публикации'),
+                ),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-pub_date', '-id'], name='recipe_pub_date_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['author', '-pub_date', '-id'], name='recipe_author_pub_date_id_idx'),
+        ),
+    ]
@@ -0,0 +1,158 @@
+from django.db import migrations, models, transaction
+from django.db.models import Count, Min, Q, Sum
+
+BATCH_SIZE = 500
+
+RELATIONS = (
+    ('Favorites', 'recipe', 'unique_favorite', 'favorite_recipe_user_idx'),
+    ('ShoppingCart', 'recipe', 'unique_shopping_cart',
+     'shopping_cart_recipe_user_idx'),
+    ('Follow', 'author', 'unique_follow', 'follow_author_user_idx'),
+)
+
+
+def constraint_and_index(target, unique_name, index_name):
+    return (
+        models.UniqueConstraint(fields=('user', target), name=unique_name),
+        models.Index(fields=[target, 'user'], name=index_name),
+    )
+
+
+def remove_duplicates(apps, schema_editor):
+    """Удаление повторяющихся связей пачками, оставляя самую раннюю."""
+    for model_name, target, _, _ in RELATIONS:
+        model = apps.get_model('foods', model_name)
+        duplicates = model.objects.values(
+            'user', target
+        ).annotate(
+            keep_id=Min('id'), total=Count('id')
+        ).filter(total__gt=1).order_by().values_list('user', target, 'keep_id')
+        user_ids = set()
+        while True:
+            batch = list(duplicates[:BATCH_SIZE])
+            if not batch:
+                break
+            condition = Q()
+            for user_id, target_id, keep_id in batch:
+                condition |= (Q(user_id=user_id, **{f'{target}_id': target_id})
+                              & ~Q(id=keep_id))
+                user_ids.add(user_id)
+            with transaction.atomic():
+                model.objects.filter(condition).delete()
+        if model_name == 'ShoppingCart':
+            rebuild_shopping_lists(apps, sorted(user_ids))
+
+
+def rebuild_shopping_lists(apps, user_ids):
+    """Пересчёт списков покупок, в которые 0009 сложила повторы корзин."""
+    ShoppingCart = apps.get_model('foods', 'ShoppingCart')
+    ShoppingListItem = apps.get_model('foods', 'ShoppingListItem')
+    for start in range(0, len(user_ids), BATCH_SIZE):
+        batch = user_ids[start:start + BATCH_SIZE]
+        totals = ShoppingCart.objects.filter(
+            user_id__in=batch, recipe__ingredientrecipe__isnull=False
+        ).values(
+            'user', 'recipe__ingredientrecipe__name'
+        ).annotate(
+            total=Sum('recipe__ingredientrecipe__amount')
+        ).order_by()
+        with transaction.atomic():
+            ShoppingListItem.objects.filter(user_id__in=batch).delete()
+            ShoppingListItem.objects.bulk_create(
+                ShoppingListItem(user_id=row['user'],
+                                 ingredient_id=row['recipe__ingredientrecipe__name'],
+                                 amount=row['total'])
+                for row in totals)
+
+
+def create_indexes(apps, schema_editor):
+    """Построение индексов без долгой блокировки таблиц.
+
+    На PostgreSQL уникальный индекс строится CONCURRENTLY, а затем
+    становится ограничением через ADD CONSTRAINT ... USING INDEX.
+    """
+    for model_name, target, unique_name, index_name in RELATIONS:
+        model = apps.get_model('foods', model_name)
+        constraint, index = constraint_and_index(target, unique_name,
+                                                 index_name)
+        if schema_editor.connection.vendor != 'postgresql':
+            # SQLite пересоздаёт таблицу по ограничениям из Meta модели.
+            model._meta.constraints = [*model._meta.constraints, constraint]
+            schema_editor.add_constraint(model, constraint)
+            schema_editor.add_index(model, index)
+            continue
+        table = model._meta.db_table
+        schema_editor.execute(
+            f'CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS "{unique_name}" '
+            f'ON "{table}" ("user_id", "{target}_id")'
+        )
+        schema_editor.execute(
+            f'ALTER TABLE "{table}" ADD CONSTRAINT "{unique_name}" '
+            f'UNIQUE USING INDEX "{unique_name}"'
+        )
+        schema_editor.execute(
+            f'CREATE INDEX CONCURRENTLY IF NOT EXISTS "{index_name}" '
+            f'ON "{table}" ("{target}_id", "user_id")'
+        )
+
+
+def drop_indexes(apps, schema_editor):
+    for model_name, target, unique_name, index_name in RELATIONS:
+        model = apps.get_model('foods', model_name)
+        constraint, index = constraint_and_index(target, unique_name,
+                                                 index_name)
+        if schema_editor.connection.vendor != 'postgresql':
+            schema_editor.remove_index(model, index)
+            schema_editor.remove_constraint(model, constraint)
+            continue
+        table = model._meta.db_table
+        schema_editor.execute(
+            f'ALTER TABLE "{table}" DROP CONSTRAINT IF EXISTS "{unique_name}"'
+        )
+        schema_editor.execute(
+            f'DROP INDEX CONCURRENTLY IF EXISTS "{index_name}"'
+        )
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('foods', '0010_recipe_pub_date_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicates, migrations.RunPython.noop),
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunPython(create_indexes, drop_indexes),
+            ],
+            state_operations=[
+                migrations.AddConstraint(
+                    model_name='favorites',
+                    constraint=models.UniqueConstraint(fields=('user', 'recipe'), name='unique_favorite'),
+                ),
+                migrations.AddIndex(
+                    model_name='favorites',
+                    index=models.Index(fields=['recipe', 'user'], name='favorite_recipe_user_idx'),
+                ),
+                migrations.AddConstraint(
+                    model_name='shoppingcart',
+                    constraint=models.UniqueConstraint(fields=('user', 'recipe'), name='unique_shopping_cart'),
+                ),
+                migrations.AddIndex(
+                    model_name='shoppingcart',
+                    index=models.Index(fields=['recipe', 'user'], name='shopping_cart_recipe_user_idx'),
+                ),
+                migrations.AddConstraint(
+                    model_name='follow',
+                    constraint=models.UniqueConstraint(fields=('user', 'author'), name='unique_follow'),
+                ),
+                migrations.AddIndex(
+                    model_name='follow',
+                    index=models.Index(fields=['author', 'user'], name='follow_author_user_idx'),
+                ),
+            ],
+        ),
+    ]
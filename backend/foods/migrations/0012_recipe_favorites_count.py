@@ -0,0 +1,38 @@
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_counters(apps, schema_editor):
+    Recipe = apps.get_model('foods', 'Recipe')
+    Favorites = apps.get_model('foods', 'Favorites')
+    User = apps.get_model('users', 'MyUser')
+    Recipe.objects.update(favorites_count=Coalesce(Subquery(
+        Favorites.objects.filter(recipe=OuterRef('pk')).order_by().values(
+            'recipe').annotate(total=Count('id')).values('total')
+    ), 0))
+    User.objects.update(recipes_count=Coalesce(Subquery(
+        Recipe.objects.filter(author=OuterRef('pk')).order_by().values(
+            'author').annotate(total=Count('id')).values('total')
+    ), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0005_myuser_recipes_count'),
+        ('foods', '0011_unique_user_relations'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='В избранном'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-favorites_count', '-id'], name='recipe_favorites_count_idx'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
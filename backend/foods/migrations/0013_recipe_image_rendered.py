@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foods', '0012_recipe_favorites_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='image_rendered',
+            field=models.CharField(blank=True, default='', max_length=100, verbose_name='Картинка с вариантами'),
+        ),
+    ]
@@ -0,0 +1,58 @@
+import django.contrib.postgres.search
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+from django.db.models import OuterRef, Subquery
+
+BATCH_SIZE = 5000
+INDEX_NAME = 'foods_recipe_search_vector_gin'
+
+
+def fill_search_vectors(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    Recipe = apps.get_model('foods', 'Recipe')
+    IngredientRecipe = apps.get_model('foods', 'IngredientRecipe')
+    ingredient_names = Subquery(
+        IngredientRecipe.objects.filter(
+            recipe=OuterRef('pk')
+        ).order_by().values('recipe').annotate(
+            names=StringAgg('name__name', ' ')
+        ).values('names')
+    )
+    vector = (SearchVector('name', weight='A', config='russian')
+              + SearchVector(ingredient_names, weight='B', config='russian')
+              + SearchVector('text', weight='C', config='russian'))
+    ids = list(Recipe.objects.order_by('id').values_list('id', flat=True))
+    for start in range(0, len(ids), BATCH_SIZE):
+        Recipe.objects.filter(
+            id__in=ids[start:start + BATCH_SIZE]
+        ).update(search_vector=vector)
+    schema_editor.execute(
+        f'CREATE INDEX CONCURRENTLY IF NOT EXISTS "{INDEX_NAME}" '
+        'ON "foods_recipe" USING gin ("search_vector")'
+    )
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS "{INDEX_NAME}"')
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('foods', '0013_recipe_image_rendered'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True, verbose_name='Поисковый вектор'),
+        ),
+        migrations.RunPython(fill_search_vectors, drop_index),
+    ]
@@ -0,0 +1,58 @@
+import re
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+BATCH_SIZE = 1000
+RECIPE_URL = re.compile(r'/recipes/(\d+)/?$')
+
+
+def copy_legacy_links(apps, schema_editor):
+    """Перенос кодов urlshortner, ведущих на существующие рецепты."""
+    Url = apps.get_model('urlshortner', 'Url')
+    Recipe = apps.get_model('foods', 'Recipe')
+    LegacyShortLink = apps.get_model('foods', 'LegacyShortLink')
+    batch = {}
+    links = Url.objects.order_by('id').values_list('short_url', 'url')
+    for code, url in links.iterator(chunk_size=BATCH_SIZE):
+        match = RECIPE_URL.search(url)
+        if match and code not in batch:
+            batch[code] = int(match.group(1))
+        if len(batch) >= BATCH_SIZE:
+            save_legacy_links(Recipe, LegacyShortLink, batch)
+            batch = {}
+    save_legacy_links(Recipe, LegacyShortLink, batch)
+
+
+def save_legacy_links(Recipe, LegacyShortLink, batch):
+    existing = set(Recipe.objects.filter(
+        pk__in=set(batch.values())).values_list('id', flat=True))
+    LegacyShortLink.objects.bulk_create(
+        (LegacyShortLink(code=code, recipe_id=recipe_id)
+         for code, recipe_id in batch.items() if recipe_id in existing),
+        ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foods', '0015_feedentry'),
+        ('urlshortner', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='link_hits',
+            field=models.PositiveIntegerField(default=0, verbose_name='Переходы по короткой ссылке'),
+        ),
+        migrations.CreateModel(
+            name='LegacyShortLink',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('code', models.CharField(max_length=20, unique=True, verbose_name='Код')),
+                ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='legacy_short_links', to='foods.recipe', verbose_name='Рецепт')),
+            ],
+        ),
+        migrations.RunPython(copy_legacy_links, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+from django.db import migrations
+
+
+def reset_renditions(apps, schema_editor):
+    """Сброс отметок о вариантах, построенных под прежними именами.
+
+    Пока отметка не совпадает с изображением, отдаётся оригинал; новые
+    варианты строит команда build_renditions.
+    """
+    Recipe = apps.get_model('foods', 'Recipe')
+    User = apps.get_model('users', 'MyUser')
+    Recipe.objects.exclude(image_rendered='').update(image_rendered='')
+    User.objects.exclude(avatar_rendered='').update(avatar_rendered='')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foods', '0018_recipechange'),
+        ('users', '0006_myuser_avatar_rendered'),
+    ]
+
+    operations = [
+        migrations.RunPython(reset_renditions, migrations.RunPython.noop),
+    ]
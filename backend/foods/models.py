@@ -1,9 +1,14 @@
 """Модели."""
 
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MinValueValidator
 from django.db import models
-from django.db.models import UniqueConstraint
+from django.db.models import F, UniqueConstraint, Window
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import RowNumber
+
+from .update_only import UpdateOnlyFieldsMixin
 
 User = get_user_model()
 
@@ -38,7 +43,58 @@ class Ingredients(models.Model):
         return self.name
 
 
-class Recipe(models.Model):
+class RecipeQuerySet(models.QuerySet):
+    """QuerySet рецептов."""
+
+    def with_related(self):
+        """Подгрузка автора, тегов и ингредиентов для сериализации."""
+        return self.select_related('author').defer(
+            'search_vector'
+        ).prefetch_related(
+            'tags',
+            models.Prefetch(
+                'ingredientrecipe_set',
+                queryset=IngredientRecipe.objects.select_related('name'),
+            ),
+        )
+
+    def with_user_flags(self, user):
+        """Аннотация признаков избранного и списка покупок для user."""
+        if user.is_anonymous:
+            return self.annotate(
+                is_favorited=models.Value(False,
+                                          output_field=models.BooleanField()),
+                is_in_shopping_cart=models.Value(
+                    False, output_field=models.BooleanField()),
+            )
+        return self.annotate(
+            is_favorited=models.Exists(Favorites.objects.filter(
+                user=user, recipe=models.OuterRef('pk'))),
+            is_in_shopping_cart=models.Exists(ShoppingCart.objects.filter(
+                user=user, recipe=models.OuterRef('pk'))),
+        )
+
+    def latest_for_authors(self, author_ids, limit=None):
+        """Последние limit рецептов каждого из авторов одним запросом."""
+        queryset = self.filter(author_id__in=author_ids).defer(
+            'search_vector')
+        if limit is None:
+            return queryset
+        ranked = queryset.annotate(
+            row_number=Window(
+                expression=RowNumber(),
+                partition_by=F('author_id'),
+                order_by=(F('pub_date').desc(), F('id').desc()),
+            )
+        ).order_by().values('id', 'row_number')
+        sql, params = ranked.query.sql_with_params()
+        return self.filter(id__in=RawSQL(
+            f'SELECT id FROM ({sql}) ranked WHERE row_number <= %s',
+            (*params, limit),
+        )).defer('search_vector')
+
+
+class Recipe(UpdateOnlyFieldsMixin, models.Model):
     """Модель рецептов."""
 
     author = models.ForeignKey(
@@ -71,11 +127,36 @@ class Recipe(models.Model):
                                        validators=[MinValueValidator(1)])
     pub_date = models.DateTimeField('Дата публикации',
                                     auto_now=True)
+    favorites_count = models.PositiveIntegerField('В избранном',
+                                                  default=0)
+    image_rendered = models.CharField('Картинка с вариантами',
+                                      max_length=100,
+                                      blank=True,
+                                      default='')
+    link_hits = models.PositiveIntegerField('Переходы по короткой ссылке',
+                                            default=0)
+    # GIN-индекс создаётся миграцией 0014 только на PostgreSQL.
+    search_vector = SearchVectorField('Поисковый вектор',
+                                      null=True,
+                                      editable=False)
+
+    UPDATE_ONLY_FIELDS = ('favorites_count', 'image_rendered', 'link_hits',
+                          'search_vector')
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
         """Метаданные."""
 
         ordering = ("-pub_date",)
+        indexes = (
+            models.Index(fields=('-pub_date', '-id'),
+                         name='recipe_pub_date_id_idx'),
+            models.Index(fields=('author', '-pub_date', '-id'),
+                         name='recipe_author_pub_date_id_idx'),
+            models.Index(fields=('-favorites_count', '-id'),
+                         name='recipe_favorites_count_idx'),
+        )
         constraints = (
             UniqueConstraint(
                 fields=("name", "author"),
@@ -134,6 +215,19 @@ class Favorites(models.Model):
                                related_name='favorites',
                                verbose_name='Рецепт')
 
+    class Meta:
+        """Метаданные."""
+
+        constraints = (
+            UniqueConstraint(
+                fields=('user', 'recipe'),
+                name='unique_favorite',
+            ),)
+        indexes = (
+            models.Index(fields=('recipe', 'user'),
+                         name='favorite_recipe_user_idx'),
+        )
+
     def __str__(self):
         """Какой рецепт добавил пользователь в избранное."""
         return f'{self.user.username} добавил {self.recipe.name} в избраннное'
@@ -153,6 +247,43 @@ class ShoppingCart(models.Model):
                                related_name='carts',
                                verbose_name='Рецепт')
 
+    class Meta:
+        """Метаданные."""
+
+        constraints = (
+            UniqueConstraint(
+                fields=('user', 'recipe'),
+                name='unique_shopping_cart',
+            ),)
+        indexes = (
+            models.Index(fields=('recipe', 'user'),
+                         name='shopping_cart_recipe_user_idx'),
+        )
+
+
+class ShoppingListItem(models.Model):
+    """Суммарное количество ингредиента в списке покупок пользователя."""
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shopping_list',
+        verbose_name='Пользователь'
+    )
+    ingredient = models.ForeignKey(Ingredients,
+                                   on_delete=models.CASCADE,
+                                   verbose_name='Ингредиент')
+    amount = models.IntegerField('Количество')
+
+    class Meta:
+        """Метаданные."""
+
+        constraints = (
+            UniqueConstraint(
+                fields=('user', 'ingredient'),
+                name='unique_shopping_list_item',
+            ),)
+
 
 class Follow(models.Model):
     """Модель подписчиков."""
@@ -169,6 +300,96 @@ class Follow(models.Model):
         on_delete=models.CASCADE,
         verbose_name='Пользователь')
 
+    class Meta:
+        """Метаданные."""
+
+        constraints = (
+            UniqueConstraint(
+                fields=('user', 'author'),
+                name='unique_follow',
+            ),)
+        indexes = (
+            models.Index(fields=('author', 'user'),
+                         name='follow_author_user_idx'),
+        )
+
     def __str__(self):
         """На кого подписался пользователь."""
         return f'Пользователь {self.user} подписан на {self.author}'
+
+
+class FeedEntry(models.Model):
+    """Запись ленты подписок пользователя с большим числом подписок."""
+
+    user = models.ForeignKey(
+        User,
+        related_name='feed',
+        on_delete=models.CASCADE,
+        verbose_name='Пользователь'
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        related_name='feed_entries',
+        on_delete=models.CASCADE,
+        verbose_name='Рецепт'
+    )
+    pub_date = models.DateTimeField('Дата публикации рецепта')
+
+    class Meta:
+        """Метаданные."""
+
+        constraints = (
+            UniqueConstraint(
+                fields=('user', 'recipe'),
+                name='unique_feed_entry',
+            ),)
+        indexes = (
+            models.Index(fields=('user', '-pub_date', '-recipe'),
+                         name='feed_user_pub_date_idx'),
+        )
+
+
+class LegacyShortLink(models.Model):
+    """Короткая ссылка на рецепт, выданная до перехода на shortlinks."""
+
+    code = models.CharField('Код', max_length=20, unique=True)
+    recipe = models.ForeignKey(
+        Recipe,
+        related_name='legacy_short_links',
+        on_delete=models.CASCADE,
+        verbose_name='Рецепт'
+    )
+
+    def __str__(self):
+        """Код ссылки."""
+        return self.code
+
+
+class ChangeStamp(models.Model):
+    """Версия набора данных, общая для всех процессов.
+
+    Индексы в памяти и кэши ответов сравнивают свою версию с этой
+    строкой и перестраиваются, когда её меняет любой процесс.
+    """
+
+    name = models.CharField('Название', max_length=50, primary_key=True)
+    version = models.CharField('Версия', max_length=32)
+    changed_at = models.DateTimeField('Дата изменения', auto_now=True)
+
+    def __str__(self):
+        """Название и версия."""
+        return f'{self.name}: {self.version}'
+
+
+class RecipeChange(models.Model):
+    """Запись об изменении ингредиентов или тегов рецепта.
+
+    Процессы читают записи с номерами больше последнего прочитанного
+    и обновляют индекс покрытия только для этих рецептов.
+    """
+
+    recipe_id = models.PositiveIntegerField('Рецепт')
+
+    def __str__(self):
+        """Номер записи и рецепт."""
+        return f'{self.pk}: {self.recipe_id}'
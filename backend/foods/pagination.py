@@ -0,0 +1,55 @@
+"""Пагинация."""
+
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+from rest_framework.pagination import CursorPagination
+
+# Ниже этого числа строк точный COUNT(*) дешёвый и оценка не нужна.
+ESTIMATED_COUNT_THRESHOLD = 100_000
+
+
+class RecipeCursorPagination(CursorPagination):
+    """Пагинация ленты рецептов по курсору без OFFSET и COUNT(*)."""
+
+    ordering = ('-pub_date', '-id')
+    page_size_query_param = 'limit'
+    max_page_size = 100
+
+
+class RecipeSearchCursorPagination(RecipeCursorPagination):
+    """Пагинация результатов поиска по курсору в порядке ранга."""
+
+    ordering = ('-rank', '-id')
+
+
+class FeedEntryCursorPagination(RecipeCursorPagination):
+    """Пагинация готовой ленты подписок по дате рецепта."""
+
+    ordering = ('-pub_date', '-recipe_id')
+
+
+class EstimatedCountPaginator(Paginator):
+    """Пагинатор админки с оценкой количества строк из статистики.
+
+    Для нефильтрованного списка большой таблицы на PostgreSQL число
+    строк берётся из pg_class.reltuples вместо полного COUNT(*).
+    Отфильтрованные списки и небольшие таблицы считаются точно.
+    """
+
+    @cached_property
+    def count(self):
+        """Оценка или точное количество объектов."""
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        if connection.vendor == 'postgresql' and not queryset.query.where:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'SELECT reltuples::bigint FROM pg_class '
+                    'WHERE oid = %s::regclass',
+                    [connection.ops.quote_name(
+                        queryset.model._meta.db_table)])
+                row = cursor.fetchone()
+            if row and row[0] > ESTIMATED_COUNT_THRESHOLD:
+                return row[0]
+        return super().count
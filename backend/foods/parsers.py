@@ -0,0 +1,28 @@
+"""Парсеры."""
+
+from rest_framework.parsers import FileUploadParser
+
+from .images import image_extension
+
+
+class ImageUploadParser(FileUploadParser):
+    """Изображение в теле запроса без base64 и multipart.
+
+    Тело передаётся обработчикам загрузки Django и пишется во временный
+    файл по мере чтения. Имя файла берётся из Content-Disposition, а
+    без него строится по Content-Type.
+    """
+
+    media_type = 'image/*'
+
+    def get_filename(self, stream, media_type, parser_context):
+        """Имя файла из заголовка или по типу изображения."""
+        return (super().get_filename(stream, media_type, parser_context)
+                or f'image.{image_extension(media_type)}')
+
+
+def image_upload_data(request, field):
+    """Данные запроса с файлом из двоичного тела под именем field."""
+    if 'file' in request.FILES and field not in request.data:
+        return {field: request.FILES['file']}
+    return request.data
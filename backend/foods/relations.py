@@ -0,0 +1,115 @@
+"""Добавление и удаление связей пользователя одним запросом."""
+
+from django.db import connection
+
+
+def parse_pk(pk):
+    """Первичный ключ из URL или None, если он не число."""
+    try:
+        return int(pk)
+    except (TypeError, ValueError):
+        return None
+
+
+def target_exists(model, target_field, pk):
+    """Существует ли объект, на который ссылается связь."""
+    target = model._meta.get_field(target_field).related_model
+    return target.objects.filter(pk=pk).exists()
+
+
+def add_relation(model, user, target_field, pk):
+    """Создание связи user с объектом pk через INSERT ... ON CONFLICT.
+
+    Возвращает True, если связь создана, False, если она уже была,
+    и None, если объекта pk нет. Успешная вставка - один запрос.
+    """
+    pk = parse_pk(pk)
+    if pk is None:
+        return None
+    quote = connection.ops.quote_name
+    field = model._meta.get_field(target_field)
+    target = field.related_model._meta
+    sql = (
+        f'INSERT INTO {quote(model._meta.db_table)} '
+        f'({quote(model._meta.get_field("user").column)}, '
+        f'{quote(field.column)}) '
+        f'SELECT %s, {quote(target.pk.column)} '
+        f'FROM {quote(target.db_table)} '
+        f'WHERE {quote(target.pk.column)} = %s '
+        f'ON CONFLICT DO NOTHING RETURNING {quote(model._meta.pk.column)}'
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, (user.pk, pk))
+        if cursor.fetchone() is not None:
+            return True
+    return False if target_exists(model, target_field, pk) else None
+
+
+def remove_relation(model, user, target_field, pk):
+    """Удаление связи user с объектом pk одним DELETE.
+
+    Возвращает True, если связь удалена, False, если её не было,
+    и None, если объекта pk нет. Сигналы модели, как и при вставке,
+    не отправляются.
+    """
+    pk = parse_pk(pk)
+    if pk is None:
+        return None
+    table, user_column, target_column = relation_columns(model,
+                                                         target_field)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {table} WHERE {user_column} = %s '
+            f'AND {target_column} = %s',
+            (user.pk, pk))
+        if cursor.rowcount:
+            return True
+    return False if target_exists(model, target_field, pk) else None
+
+
+def relation_columns(model, target_field):
+    """Таблица и столбцы пользователя и объекта связи в кавычках."""
+    quote = connection.ops.quote_name
+    return (quote(model._meta.db_table),
+            quote(model._meta.get_field('user').column),
+            quote(model._meta.get_field(target_field).column))
+
+
+def add_relations(model, user, target_field, pks):
+    """Создание связей user с объектами pks одним INSERT.
+
+    pks должны существовать. Возвращает множество pk, для которых
+    связь создана; для остальных она уже была.
+    """
+    if not pks:
+        return set()
+    table, user_column, target_column = relation_columns(model,
+                                                         target_field)
+    values = ', '.join(['(%s, %s)'] * len(pks))
+    params = [value for pk in pks for value in (user.pk, pk)]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {table} ({user_column}, {target_column}) '
+            f'VALUES {values} '
+            f'ON CONFLICT DO NOTHING RETURNING {target_column}',
+            params)
+        return {row[0] for row in cursor.fetchall()}
+
+
+def remove_relations(model, user, target_field, pks):
+    """Удаление связей user с объектами pks одним DELETE ... RETURNING.
+
+    Возвращает множество pk, для которых связь была удалена.
+    """
+    if not pks:
+        return set()
+    table, user_column, target_column = relation_columns(model,
+                                                         target_field)
+    placeholders = ', '.join(['%s'] * len(pks))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {table} WHERE {user_column} = %s '
+            f'AND {target_column} IN ({placeholders}) '
+            f'RETURNING {target_column}',
+            [user.pk, *pks])
+        return {row[0] for row in cursor.fetchall()}
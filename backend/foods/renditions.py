@@ -0,0 +1,155 @@
+"""Уменьшенные варианты изображений рецептов и аватаров."""
+
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connections, transaction
+from PIL import Image, ImageOps, features
+
+from .cache import bump_content_version
+
+logger = logging.getLogger(__name__)
+
+# Формат файла, расширение и параметры сохранения Pillow.
+FORMATS = (
+    ('webp', 'WEBP', {'quality': 80, 'method': 4}),
+    ('jpeg', 'JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def available_formats():
+    """Форматы, которые умеет сохранять установленный Pillow."""
+    return [(extension, pil_format, options)
+            for extension, pil_format, options in FORMATS
+            if pil_format != 'WEBP' or features.check('webp')]
+
+
+def rendition_name(name, width, extension):
+    """Имя варианта в подкаталоге оригинала.
+
+    photo.png -> renditions/photo.png_320w.webp. Имя оригинала берётся
+    целиком, с расширением: хранилище делает имена оригиналов
+    уникальными, поэтому варианты photo.png и photo.jpeg не совпадают,
+    а в каталоге renditions нет самих оригиналов.
+    """
+    directory, filename = os.path.split(name)
+    return os.path.join(directory, 'renditions',
+                        f'{filename}_{width}w.{extension}')
+
+
+def rendition_urls(file, rendered, request=None):
+    """Адреса вариантов по ширине и формату.
+
+    rendered - имя файла, для которого варианты уже построены. Пока оно
+    не совпадает с текущим, вместо каждого варианта отдаётся оригинал.
+    """
+    if not file:
+        return None
+    ready = file.name == rendered
+
+    def url(name):
+        location = file.storage.url(name)
+        return request.build_absolute_uri(location) if request else location
+
+    original = url(file.name)
+    return {
+        str(width): {
+            extension: (url(rendition_name(file.name, width, extension))
+                        if ready else original)
+            for extension, _, _ in available_formats()
+        }
+        for width in settings.IMAGE_RENDITION_WIDTHS
+    }
+
+
+def render(file):
+    """Сохранение вариантов изображения file во всех ширинах и форматах."""
+    with file.storage.open(file.name, 'rb') as source:
+        with Image.open(source) as image:
+            # draft() действует только до загрузки пикселей, то есть до
+            # exif_transpose. Квадрат подходит для обеих ориентаций.
+            image.draft('RGB', (max(settings.IMAGE_RENDITION_WIDTHS),) * 2)
+            image = ImageOps.exif_transpose(image)
+            image = image.convert('RGB')
+            for width in settings.IMAGE_RENDITION_WIDTHS:
+                resized = image
+                if image.width > width:
+                    resized = image.resize(
+                        (width, round(image.height * width / image.width)),
+                        Image.LANCZOS)
+                for extension, pil_format, options in available_formats():
+                    buffer = BytesIO()
+                    resized.save(buffer, pil_format, **options)
+                    name = rendition_name(file.name, width, extension)
+                    file.storage.delete(name)
+                    file.storage.save(name, ContentFile(buffer.getvalue()))
+
+
+def delete_renditions(storage, name):
+    """Удаление всех вариантов изображения name."""
+    for width in settings.IMAGE_RENDITION_WIDTHS:
+        for extension, _, _ in FORMATS:
+            storage.delete(rendition_name(name, width, extension))
+
+
+def schedule_removal(file, rendered, deleted=False):
+    """Удаление после коммита вариантов файла, который больше не нужен.
+
+    rendered - файл, для которого варианты построены. Они удаляются,
+    когда объект удалён или его изображение заменено другим.
+    """
+    if rendered and (deleted or not file or file.name != rendered):
+        storage = file.storage
+        transaction.on_commit(lambda: delete_renditions(storage, rendered))
+
+
+def build_renditions(model, pk, field, source_field):
+    """Построение вариантов изображения объекта и отметка о готовности.
+
+    Отметка ставится условным UPDATE: если изображение успели заменить,
+    она не совпадёт с новым файлом, для него будет своя задача, а
+    только что построенные варианты удаляются.
+    """
+    obj = model.objects.filter(pk=pk).only(field).first()
+    file = getattr(obj, field, None)
+    if not file:
+        return False
+    render(file)
+    updated = model.objects.filter(pk=pk, **{field: file.name}).update(
+        **{source_field: file.name})
+    if updated:
+        bump_content_version()
+    else:
+        delete_renditions(file.storage, file.name)
+    return bool(updated)
+
+
+def run_in_background(*args):
+    """Выполнение build_renditions с закрытием соединений потока."""
+    try:
+        build_renditions(*args)
+    except Exception:
+        logger.exception('Не удалось построить варианты изображения %s', args)
+    finally:
+        connections.close_all()
+
+
+def schedule_renditions(model, pk, field, source_field):
+    """Запуск построения вариантов в пуле потоков после коммита."""
+    def submit():
+        global _executor
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=settings.IMAGE_RENDITION_WORKERS,
+                    thread_name_prefix='renditions')
+        _executor.submit(run_in_background, model, pk, field, source_field)
+    transaction.on_commit(submit)
@@ -0,0 +1,150 @@
+"""Полнотекстовый поиск рецептов."""
+
+import heapq
+import re
+import threading
+from bisect import bisect_left
+from collections import defaultdict
+
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            SearchVector)
+from django.db import connection
+from django.db.models import Case, F, IntegerField, OuterRef, Subquery, When
+
+from .cache import get_content_version
+from .ingredient_index import normalize
+from .models import IngredientRecipe, Recipe
+
+SEARCH_CONFIG = 'russian'
+WORD_RE = re.compile(r'\w+')
+
+# Вес совпадения в названии, ингредиентах и описании.
+NAME_WEIGHT = 4
+INGREDIENT_WEIGHT = 2
+TEXT_WEIGHT = 1
+
+# Сколько лучших результатов отдаёт индекс в памяти. Ранг передаётся в
+# запрос выражением CASE с параметрами на каждый рецепт, а у SQLite
+# число параметров запроса ограничено.
+FALLBACK_MAX_RESULTS = 200
+
+
+def use_postgres():
+    """Поиск через tsvector доступен только на PostgreSQL."""
+    return connection.vendor == 'postgresql'
+
+
+def search_vector():
+    """Выражение tsvector рецепта: название, ингредиенты, описание."""
+    ingredient_names = Subquery(
+        IngredientRecipe.objects.filter(
+            recipe=OuterRef('pk')
+        ).order_by().values('recipe').annotate(
+            names=StringAgg('name__name', ' ')
+        ).values('names')
+    )
+    return (SearchVector('name', weight='A', config=SEARCH_CONFIG)
+            + SearchVector(ingredient_names, weight='B',
+                           config=SEARCH_CONFIG)
+            + SearchVector('text', weight='C', config=SEARCH_CONFIG))
+
+
+def update_search_vectors(recipes):
+    """Пересчёт search_vector рецептов (список id или подзапрос)."""
+    if use_postgres():
+        Recipe.objects.filter(pk__in=recipes).update(
+            search_vector=search_vector())
+
+
+def words(value):
+    """Нормализованные слова строки."""
+    return WORD_RE.findall(normalize(value))
+
+
+class RecipeSearchIndex:
+    """Обратный индекс рецептов в памяти процесса.
+
+    Заменяет tsvector на базах, отличных от PostgreSQL, чтобы поиск
+    работал при локальной разработке. Индекс перестраивается при смене
+    версии содержимого рецептов. Слова запроса сопоставляются со
+    словами рецептов по префиксу, что заменяет стемминг.
+    """
+
+    def __init__(self):
+        """Создание пустого индекса."""
+        self._lock = threading.Lock()
+        self._version = None
+        self._words = []
+        self._postings = {}
+
+    def _refresh(self):
+        """Перестроение индекса, если версия содержимого изменилась."""
+        version = get_content_version()
+        if version == self._version:
+            return
+        with self._lock:
+            if version == self._version:
+                return
+            postings = defaultdict(dict)
+
+            def add(recipe_id, value, weight):
+                for word in words(value):
+                    scores = postings[word]
+                    scores[recipe_id] = max(scores.get(recipe_id, 0), weight)
+
+            for recipe_id, name, text in Recipe.objects.values_list(
+                    'id', 'name', 'text').iterator():
+                add(recipe_id, name, NAME_WEIGHT)
+                add(recipe_id, text, TEXT_WEIGHT)
+            for recipe_id, name in IngredientRecipe.objects.values_list(
+                    'recipe_id', 'name__name').iterator():
+                add(recipe_id, name, INGREDIENT_WEIGHT)
+            self._words = sorted(postings)
+            self._postings = dict(postings)
+            self._version = version
+
+    def search(self, query):
+        """Id рецептов со всеми словами query и их ранг."""
+        self._refresh()
+        ranks = None
+        for term in words(query):
+            start = bisect_left(self._words, term)
+            end = bisect_left(self._words, term + chr(0x10FFFF), start)
+            scores = {}
+            for word in self._words[start:end]:
+                for recipe_id, weight in self._postings[word].items():
+                    scores[recipe_id] = max(scores.get(recipe_id, 0), weight)
+            if ranks is None:
+                ranks = scores
+            else:
+                ranks = {recipe_id: rank + scores[recipe_id]
+                         for recipe_id, rank in ranks.items()
+                         if recipe_id in scores}
+            if not ranks:
+                break
+        return ranks or {}
+
+
+recipe_search_index = RecipeSearchIndex()
+
+
+def search_recipes(queryset, query):
+    """Рецепты queryset, подходящие под query, по убыванию ранга.
+
+    Без PostgreSQL ранжируются только FALLBACK_MAX_RESULTS лучших
+    совпадений из индекса в памяти.
+    """
+    if use_postgres():
+        search_query = SearchQuery(query, config=SEARCH_CONFIG,
+                                   search_type='websearch')
+        return queryset.filter(search_vector=search_query).annotate(
+            rank=SearchRank(F('search_vector'), search_query)
+        ).order_by('-rank', '-id')
+    ranks = dict(heapq.nlargest(
+        FALLBACK_MAX_RESULTS, recipe_search_index.search(query).items(),
+        key=lambda item: (item[1], item[0])))
+    return queryset.filter(pk__in=ranks).annotate(
+        rank=Case(*(When(pk=pk, then=rank) for pk, rank in ranks.items()),
+                  default=0, output_field=IntegerField())
+    ).order_by('-rank', '-id')
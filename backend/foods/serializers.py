@@ -1,33 +1,35 @@
 """Сериализаторы."""
-import base64
-
 from django.contrib.auth import get_user_model
-from django.core.files.base import ContentFile
-from django.shortcuts import get_object_or_404
+from django.db import transaction
 from djoser.serializers import UserSerializer
 from rest_framework import serializers
-from rest_framework.validators import UniqueTogetherValidator
-from urlshortner.utils import shorten_url
 
+from .images import check_image, decode_base64_image
 from .models import (Favorites, Follow, IngredientRecipe, Ingredients, Recipe,
-                     ShoppingCart, Tag)
+                     ShoppingCart, Tag, TagRecipe)
+from .renditions import rendition_urls
+from .shopping_list import (change_recipe_in_shopping_lists,
+                            shopping_lists_updated_explicitly)
+from .shortlinks import short_link_url
 
 User = get_user_model()
 
 
 class Base64ImageField(serializers.ImageField):
-    """Сериализатор изображений."""
+    """Сериализатор изображений.
+
+    Принимает data URI в base64 и загруженные файлы из multipart или
+    двоичного тела запроса.
+    """
 
     is_subscribed = serializers.SerializerMethodField()
 
     def to_internal_value(self, data):
         """Преобразование изображения в строковый формат."""
         if isinstance(data, str) and data.startswith('data:image'):
-            format, imgstr = data.split(';base64,')
-            ext = format.split('/')[-1]
-
-            data = ContentFile(base64.b64decode(imgstr), name='temp.' + ext)
-
+            data = decode_base64_image(data)
+        if hasattr(data, 'size') and hasattr(data, 'seek'):
+            check_image(data)
         return super().to_internal_value(data)
 
 
@@ -36,55 +38,34 @@ class UserViewSerializer(UserSerializer):
 
     is_subscribed = serializers.SerializerMethodField(read_only=True)
     avatar = Base64ImageField(required=False, allow_null=True)
+    avatar_renditions = serializers.SerializerMethodField()
 
     class Meta:
         """Метаданные."""
 
         model = User
         fields = ("email", "id", "username", "first_name",
-                  "last_name", 'is_subscribed', 'avatar')
+                  "last_name", 'is_subscribed', 'avatar',
+                  'avatar_renditions')
+
+    def get_avatar_renditions(self, obj):
+        """Уменьшенные варианты аватара."""
+        return rendition_urls(obj.avatar, obj.avatar_rendered,
+                              self.context.get('request'))
 
     def get_is_subscribed(self, obj):
         """Получение подписчиков."""
         request = self.context.get('request')
         if not request or request.user.is_anonymous:
             return False
-        return Follow.objects.filter(
-            user=request.user, author=obj
-        ).exists()
-
-
-class SubscribeSerializer(serializers.ModelSerializer):
-    """Сериализатор для подписки/отписки от пользователей."""
-
-    class Meta:
-        """Метаданные."""
-
-        model = Follow
-        fields = '__all__'
-        validators = [
-            UniqueTogetherValidator(
-                queryset=Follow.objects.all(),
-                fields=('user', 'author'),
-                message='Вы уже подписаны на этого пользователя'
-            )
-        ]
-
-    def validate(self, data):
-        """Проверка подписки на самого себя."""
-        request = self.context.get('request')
-        if request.user == data['author']:
-            raise serializers.ValidationError(
-                'Нельзя подписываться на самого себя!'
-            )
-        return data
-
-    def to_representation(self, instance):
-        """Информация об авторе, на которого оформлена подписка."""
-        request = self.context.get('request')
-        return FollowSerializer(
-            instance.author, context={'request': request}
-        ).data
+        # Подписки загружаются одним запросом на весь ответ: контекст
+        # общий для корневого и всех вложенных сериализаторов.
+        if 'followed_ids' not in self.context:
+            self.context['followed_ids'] = set(
+                Follow.objects.filter(
+                    user=request.user
+                ).values_list('author_id', flat=True))
+        return obj.id in self.context['followed_ids']
 
 
 class FollowSerializer(UserViewSerializer):
@@ -92,7 +73,7 @@ class FollowSerializer(UserViewSerializer):
 
     is_subscribed = serializers.SerializerMethodField()
     recipes = serializers.SerializerMethodField(read_only=True)
-    recipes_count = serializers.SerializerMethodField()
+    recipes_count = serializers.IntegerField(read_only=True)
 
     class Meta:
         """Метаданные."""
@@ -103,18 +84,18 @@ class FollowSerializer(UserViewSerializer):
 
     def get_recipes(self, obj):
         """Получение рецептов подписчиков."""
-        request = self.context.get('request')
-        limit = request.query_params.get('recipes_limit')
-        recipes = Recipe.objects.filter(author=obj)
-        if limit:
-            recipes = recipes[:int(limit)]
-        serializer = RecipeListSerializers(recipes, many=True)
+        if hasattr(obj, 'latest_recipes'):
+            recipes = obj.latest_recipes
+        else:
+            request = self.context.get('request')
+            limit = request.query_params.get('recipes_limit')
+            recipes = Recipe.objects.filter(author=obj)
+            if limit:
+                recipes = recipes[:int(limit)]
+        serializer = RecipeMiniSerializer(recipes, many=True,
+                                          context=self.context)
         return serializer.data
 
-    def get_recipes_count(self, obj):
-        """Получение количества рецептов."""
-        return Recipe.objects.filter(author=obj).count()
-
 
 class IngredientsSerializers(serializers.ModelSerializer):
     """Сериализатор ингредиентов."""
@@ -161,12 +142,8 @@ class RecipeShortLink(serializers.ModelSerializer):
         fields = ('short_link',)
 
     def get_short_link(self, obj):
-        """Создание короткой ссылки."""
-        base_url = 'https://foodgram-eats.ddns.net/'
-        created = shorten_url(
-            f'{base_url}recipes/{obj.id}',
-            is_permanent=False)
-        return f'{base_url}s/{created}'
+        """Короткая ссылка, вычисленная из id рецепта."""
+        return short_link_url(obj.id, self.context['request'])
 
     def to_representation(self, instance):
         """Изменение название ключа."""
@@ -176,10 +153,12 @@ class RecipeShortLink(serializers.ModelSerializer):
 
 
 class IngredientRecipeSerializer(serializers.ModelSerializer):
-    """Сериализатор ингредиентов."""
+    """Сериализатор ингредиентов рецепта."""
 
-    amount = serializers.SerializerMethodField()
-    measurement_unit = serializers.SerializerMethodField()
+    id = serializers.ReadOnlyField(source='name.id')
+    name = serializers.ReadOnlyField(source='name.name')
+    measurement_unit = serializers.ReadOnlyField(
+        source='name.measurement_unit')
 
     class Meta:
         """Метаданные."""
@@ -187,28 +166,18 @@ class IngredientRecipeSerializer(serializers.ModelSerializer):
         model = IngredientRecipe
         fields = ('id', 'name', 'measurement_unit', 'amount')
 
-    def get_amount(self, obj):
-        """Получение количества."""
-        ingredient_recipe = IngredientRecipe.objects.filter(
-            name__name=obj).first()
-        return f'{ingredient_recipe.amount}'
-
-    def get_measurement_unit(self, obj):
-        """Получение измерения."""
-        measurement_unit = IngredientRecipe.objects.filter(
-            name__name=obj).first()
-        return f'{measurement_unit.name.measurement_unit}'
-
 
 class RecipeListSerializers(serializers.ModelSerializer):
     """Сериализатор безопасных запросов рецептов."""
 
     image = Base64ImageField(required=True, allow_null=True)
-    ingredients = IngredientRecipeSerializer(read_only=True, many=True)
+    ingredients = IngredientRecipeSerializer(source='ingredientrecipe_set',
+                                             read_only=True, many=True)
     tags = TagsSerializers(read_only=True, many=True)
     author = UserViewSerializer(read_only=True)
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
+    image_renditions = serializers.SerializerMethodField()
 
     class Meta:
         """Метаданные."""
@@ -216,10 +185,19 @@ class RecipeListSerializers(serializers.ModelSerializer):
         model = Recipe
         fields = ('id', 'tags', 'author', 'ingredients',
                   'is_favorited', 'is_in_shopping_cart', 'name',
-                  'image', 'text', 'cooking_time',)
+                  'image', 'image_renditions', 'text', 'cooking_time',
+                  'favorites_count',)
+        read_only_fields = ('favorites_count',)
+
+    def get_image_renditions(self, obj):
+        """Уменьшенные варианты изображения."""
+        return rendition_urls(obj.image, obj.image_rendered,
+                              self.context.get('request'))
 
     def get_is_favorited(self, obj):
         """Получения избранных."""
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         request = self.context.get('request')
         return (request and request.user.is_authenticated
                 and Favorites.objects.filter(
@@ -228,6 +206,8 @@ class RecipeListSerializers(serializers.ModelSerializer):
 
     def get_is_in_shopping_cart(self, obj):
         """Получения списка покупок."""
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         request = self.context.get('request')
         return (request and request.user.is_authenticated
                 and ShoppingCart.objects.filter(
@@ -235,6 +215,43 @@ class RecipeListSerializers(serializers.ModelSerializer):
                 ).exists())
 
 
+class RecipeCoverageSerializer(RecipeListSerializers):
+    """Сериализатор рецепта с долей имеющихся ингредиентов."""
+
+    coverage = serializers.FloatField(read_only=True)
+    matched_ingredients = serializers.IntegerField(read_only=True)
+    total_ingredients = serializers.IntegerField(read_only=True)
+
+    class Meta(RecipeListSerializers.Meta):
+        """Метаданные."""
+
+        fields = RecipeListSerializers.Meta.fields + (
+            'coverage', 'matched_ingredients', 'total_ingredients')
+
+
+class InBulkRelatedField(serializers.ManyRelatedField):
+    """Список первичных ключей, загружаемых одним запросом in_bulk.
+
+    В отличие от PrimaryKeyRelatedField(many=True) не делает запрос на
+    каждый элемент и сообщает обо всех отсутствующих ключах сразу.
+    """
+
+    def to_internal_value(self, data):
+        """Загрузка объектов по списку первичных ключей."""
+        ids = serializers.ListField(
+            child=serializers.IntegerField(), allow_empty=self.allow_empty
+        ).run_validation(data)
+        if len(set(ids)) != len(ids):
+            raise serializers.ValidationError('Значения должны быть '
+                                              'уникальными.')
+        objects = self.child_relation.get_queryset().in_bulk(ids)
+        missing = [pk for pk in ids if pk not in objects]
+        if missing:
+            raise serializers.ValidationError(
+                f'Объекты не найдены: {", ".join(map(str, missing))}.')
+        return [objects[pk] for pk in ids]
+
+
 class RecipeWriteSerializers(serializers.ModelSerializer):
     """Сериализатор изменения рецептов."""
 
@@ -244,84 +261,115 @@ class RecipeWriteSerializers(serializers.ModelSerializer):
     author = serializers.PrimaryKeyRelatedField(
         read_only=True,
         default=serializers.CurrentUserDefault())
-    tags = serializers.PrimaryKeyRelatedField(
+    tags = InBulkRelatedField(
+        child_relation=serializers.PrimaryKeyRelatedField(
+            queryset=Tag.objects.all()),
         required=True,
-        queryset=Tag.objects.all(),
-        many=True
+        allow_empty=False,
     )
 
+    def validate_ingredients(self, value):
+        """Проверка всех ингредиентов одним запросом."""
+        ids = [ingredient['id'] for ingredient in value]
+        if len(set(ids)) != len(ids):
+            raise serializers.ValidationError(
+                'Ингредиенты должны быть уникальными.')
+        found = Ingredients.objects.only('id').in_bulk(ids)
+        missing = [pk for pk in ids if pk not in found]
+        if missing:
+            raise serializers.ValidationError(
+                f'Ингредиенты не найдены: {", ".join(map(str, missing))}.')
+        return value
+
+    @transaction.atomic
     def create(self, validated_data):
         """Создание рецепта."""
         ingredients = validated_data.pop('ingredients')
         tags = validated_data.pop('tags')
-
-        ingredient_ids = [ingredient['id'] for ingredient in ingredients]
-        if len(set(ingredient_ids)) != len(ingredient_ids):
-            raise serializers.ValidationError(
-                'Ингредиенты должны быть уникальными.')
-
-        tag_ids = [tag for tag in tags]
-        if len(set(tag_ids)) != len(tag_ids):
-            raise serializers.ValidationError('Теги должны быть уникальными.')
-
         recipe = Recipe.objects.create(**validated_data)
-        recipe.tags.set(tags)
-        ingredient_list = []
-        for ingredient in ingredients:
-            current_ingredient = get_object_or_404(Ingredients,
-                                                   id=ingredient.get('id'))
-            amount = ingredient.get('amount')
-            ingredient_list.append(
-                IngredientRecipe(
-                    recipe=recipe,
-                    name=current_ingredient,
-                    amount=amount
-                )
-            )
-        IngredientRecipe.objects.bulk_create(ingredient_list)
+        TagRecipe.objects.bulk_create(
+            TagRecipe(recipe=recipe, name=tag) for tag in tags)
+        IngredientRecipe.objects.bulk_create(
+            IngredientRecipe(recipe=recipe, name_id=ingredient['id'],
+                             amount=ingredient['amount'])
+            for ingredient in ingredients)
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
-        """Изменение рецепта."""
+        """Изменение рецепта с записью только изменившихся связей."""
         ingredients = validated_data.pop('ingredients')
         tags = validated_data.pop('tags')
-        instance.tags.clear()
-        instance.tags.set(tags)
-
-        IngredientRecipe.objects.filter(recipe=instance).delete()
         super().update(instance, validated_data)
-        ingredient_list = []
-
-        for ingredient in ingredients:
-            current_ingredient = get_object_or_404(Ingredients,
-                                                   id=ingredient.get('id'))
-            amount = ingredient.get('amount')
-            ingredient_list.append(
-                IngredientRecipe(
-                    recipe=instance,
-                    name=current_ingredient,
-                    amount=amount
-                )
-            )
-        IngredientRecipe.objects.bulk_create(ingredient_list)
-        instance.save()
+
+        old_tags = set(TagRecipe.objects.filter(
+            recipe=instance).values_list('name_id', flat=True))
+        new_tags = {tag.id for tag in tags}
+        TagRecipe.objects.filter(
+            recipe=instance, name_id__in=old_tags - new_tags).delete()
+        TagRecipe.objects.bulk_create(
+            TagRecipe(recipe=instance, name_id=tag_id)
+            for tag_id in new_tags - old_tags)
+
+        current = {
+            item.name_id: item
+            for item in IngredientRecipe.objects.filter(recipe=instance)
+        }
+        old_amounts = {pk: item.amount for pk, item in current.items()}
+        new_amounts = {ingredient['id']: ingredient['amount']
+                       for ingredient in ingredients}
+        changed = []
+        for pk, amount in new_amounts.items():
+            if pk in current and current[pk].amount != amount:
+                current[pk].amount = amount
+                changed.append(current[pk])
+        with shopping_lists_updated_explicitly():
+            IngredientRecipe.objects.filter(id__in=[
+                item.id for pk, item in current.items()
+                if pk not in new_amounts
+            ]).delete()
+        IngredientRecipe.objects.bulk_update(changed, ('amount',))
+        IngredientRecipe.objects.bulk_create(
+            IngredientRecipe(recipe=instance, name_id=pk, amount=amount)
+            for pk, amount in new_amounts.items() if pk not in current)
+        change_recipe_in_shopping_lists(instance, old_amounts, new_amounts)
         return instance
 
     class Meta:
         """Метаданные."""
 
         model = Recipe
-        fields = "__all__"
+        exclude = ('search_vector',)
+        read_only_fields = ('favorites_count', 'image_rendered', 'link_hits')
+
+
+class RecipeImageSerializer(serializers.ModelSerializer):
+    """Сериализатор замены изображения рецепта."""
+
+    image = Base64ImageField(required=True)
+
+    class Meta:
+        """Метаданные."""
+
+        model = Recipe
+        fields = ('image',)
 
 
 class RecipeMiniSerializer(serializers.ModelSerializer):
     """Сериализатор  для вывода  в FollowSerializer."""
 
+    image_renditions = serializers.SerializerMethodField()
+
     class Meta:
         """Метаданные."""
 
         model = Recipe
-        fields = ('id', 'name', 'cooking_time', 'image',)
+        fields = ('id', 'name', 'cooking_time', 'image', 'image_renditions',)
+
+    def get_image_renditions(self, obj):
+        """Уменьшенные варианты изображения."""
+        return rendition_urls(obj.image, obj.image_rendered,
+                              self.context.get('request'))
 
 
 class FavoriteSerializer(serializers.ModelSerializer):
@@ -355,3 +403,32 @@ class FavoriteOrShoppingCartSerializer(serializers.ModelSerializer):
 
         model = Recipe
         fields = ('id', 'name', 'image', 'cooking_time')
+
+
+class RecipeIdsSerializer(serializers.Serializer):
+    """Сериализатор списка id рецептов для пакетных операций."""
+
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=100,
+    )
+
+
+class CoverageQuerySerializer(serializers.Serializer):
+    """Сериализатор параметров подбора рецептов по ингредиентам."""
+
+    ingredients = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=200,
+    )
+    tags = serializers.ListField(
+        child=serializers.SlugField(),
+        required=False,
+    )
+    min_coverage = serializers.FloatField(
+        min_value=0,
+        max_value=1,
+        default=0,
+    )
@@ -0,0 +1,248 @@
+"""Формирование списка покупок.
+
+Запросы API меняют ShoppingListItem на разницу количеств сразу, в той
+же транзакции. Изменения корзин и ингредиентов рецептов через модели
+(админка, каскадное удаление) ловят сигналы: списки затронутых
+пользователей пересчитываются целиком после коммита.
+"""
+
+import csv
+import json
+import threading
+from collections import Counter
+from contextlib import contextmanager
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Sum
+
+from .models import IngredientRecipe, ShoppingCart, ShoppingListItem
+
+User = get_user_model()
+
+CHUNK_SIZE = 500
+BATCH_SIZE = 1000
+
+_local = threading.local()
+
+
+class Echo:
+    """Файлоподобный объект, возвращающий записанную строку."""
+
+    def write(self, value):
+        """Возвращение строки вместо записи в буфер."""
+        return value
+
+
+def recipe_amounts(*recipes):
+    """Суммарное количество каждого ингредиента в рецептах."""
+    amounts = Counter()
+    for ingredient_id, amount in IngredientRecipe.objects.filter(
+        recipe__in=recipes
+    ).values_list('name_id', 'amount'):
+        amounts[ingredient_id] += amount
+    return amounts
+
+
+def apply_deltas(user_ids, deltas):
+    """Изменение списков покупок пользователей на deltas.
+
+    deltas - словарь {id ингредиента: изменение количества}. Строки с
+    нулевым и отрицательным количеством удаляются.
+    """
+    user_ids = list(user_ids)
+    deltas = {key: value for key, value in deltas.items() if value}
+    if not user_ids or not deltas:
+        return
+    with transaction.atomic():
+        lock_users(user_ids)
+        existing = {
+            (item.user_id, item.ingredient_id): item
+            for item in ShoppingListItem.objects.filter(
+                user_id__in=user_ids, ingredient_id__in=deltas)
+        }
+        for item in existing.values():
+            item.amount += deltas[item.ingredient_id]
+        ShoppingListItem.objects.bulk_update(
+            [item for item in existing.values() if item.amount > 0],
+            ('amount',), batch_size=BATCH_SIZE)
+        ShoppingListItem.objects.filter(id__in=[
+            item.id for item in existing.values() if item.amount <= 0
+        ]).delete()
+        ShoppingListItem.objects.bulk_create(
+            (ShoppingListItem(user_id=user_id, ingredient_id=ingredient_id,
+                              amount=delta)
+             for user_id in user_ids
+             for ingredient_id, delta in deltas.items()
+             if delta > 0 and (user_id, ingredient_id) not in existing),
+            batch_size=BATCH_SIZE)
+
+
+def lock_users(user_ids):
+    """Блокировка строк пользователей до конца транзакции.
+
+    Блокируются сами пользователи, а не строки списка: строк для новых
+    ингредиентов ещё нет, и без общей блокировки параллельные запросы
+    вставили бы одну и ту же строку дважды.
+    """
+    list(User.objects.select_for_update().filter(
+        pk__in=user_ids).order_by('pk').values_list('pk', flat=True))
+
+
+def rebuild_shopping_lists(user_ids, verify=False):
+    """Пересчёт списков покупок пользователей по их корзинам.
+
+    Возвращает количество исправленных (при verify - найденных)
+    расхождений.
+    """
+    user_ids = list(user_ids)
+    if not user_ids:
+        return 0
+    with transaction.atomic():
+        lock_users(user_ids)
+        expected = {
+            (row['user'], row['recipe__ingredientrecipe__name']): row['total']
+            for row in ShoppingCart.objects.filter(
+                user_id__in=user_ids,
+                recipe__ingredientrecipe__isnull=False,
+            ).values(
+                'user', 'recipe__ingredientrecipe__name'
+            ).annotate(
+                total=Sum('recipe__ingredientrecipe__amount')
+            ).order_by()
+        }
+        actual = {
+            (item.user_id, item.ingredient_id): item
+            for item in ShoppingListItem.objects.filter(user_id__in=user_ids)
+        }
+        changed, created, deleted = [], [], []
+        for key, item in actual.items():
+            if key not in expected:
+                deleted.append(item.id)
+            elif item.amount != expected[key]:
+                item.amount = expected[key]
+                changed.append(item)
+        for (user_id, ingredient_id), total in expected.items():
+            if (user_id, ingredient_id) not in actual:
+                created.append(ShoppingListItem(
+                    user_id=user_id, ingredient_id=ingredient_id,
+                    amount=total))
+        if not verify:
+            ShoppingListItem.objects.filter(id__in=deleted).delete()
+            ShoppingListItem.objects.bulk_update(
+                changed, ('amount',), batch_size=BATCH_SIZE)
+            ShoppingListItem.objects.bulk_create(
+                created, batch_size=BATCH_SIZE)
+    return len(changed) + len(created) + len(deleted)
+
+
+@contextmanager
+def shopping_lists_updated_explicitly():
+    """Отключение пересчёта по сигналам внутри блока.
+
+    Код API сам переносит изменения в списки покупок, поэтому сигналы
+    моделей, сработавшие внутри блока, ничего не планируют.
+    """
+    _local.explicit = getattr(_local, 'explicit', 0) + 1
+    try:
+        yield
+    finally:
+        _local.explicit -= 1
+
+
+def schedule_rebuild(user_ids=(), recipe_ids=()):
+    """Пересчёт после коммита списков пользователей и корзин с рецептами.
+
+    Все вызовы одной транзакции копятся в общем наборе, и первый
+    обработчик on_commit пересчитывает их одним вызовом.
+    """
+    if getattr(_local, 'explicit', 0):
+        return
+    if not hasattr(_local, 'users'):
+        _local.users, _local.recipes = set(), set()
+    _local.users.update(user_ids)
+    _local.recipes.update(recipe_ids)
+    transaction.on_commit(rebuild_scheduled)
+
+
+def rebuild_scheduled():
+    """Пересчёт списков, запланированных schedule_rebuild."""
+    user_ids, recipe_ids = _local.users, _local.recipes
+    if not user_ids and not recipe_ids:
+        return
+    _local.users, _local.recipes = set(), set()
+    if recipe_ids:
+        user_ids |= set(ShoppingCart.objects.filter(
+            recipe_id__in=recipe_ids).values_list('user_id', flat=True))
+    user_ids = sorted(user_ids)
+    for start in range(0, len(user_ids), BATCH_SIZE):
+        rebuild_shopping_lists(user_ids[start:start + BATCH_SIZE])
+
+
+def add_recipes_to_shopping_list(user, *recipes):
+    """Добавление ингредиентов рецептов в список покупок."""
+    if recipes:
+        apply_deltas([user.id], recipe_amounts(*recipes))
+
+
+def remove_recipes_from_shopping_list(user, *recipes):
+    """Вычитание ингредиентов рецептов из списка покупок."""
+    if recipes:
+        amounts = recipe_amounts(*recipes)
+        apply_deltas([user.id],
+                     {key: -value for key, value in amounts.items()})
+
+
+def change_recipe_in_shopping_lists(recipe, old_amounts, new_amounts):
+    """Перенос изменения ингредиентов рецепта во все списки покупок."""
+    deltas = Counter(new_amounts)
+    deltas.subtract(old_amounts)
+    if any(deltas.values()):
+        apply_deltas(ShoppingCart.objects.filter(
+            recipe=recipe
+        ).values_list('user_id', flat=True), deltas)
+
+
+def shopping_list_items(user):
+    """Суммарное количество ингредиентов из списка покупок user."""
+    return ShoppingListItem.objects.filter(
+        user=user, amount__gt=0
+    ).order_by(
+        'ingredient__name', 'ingredient__measurement_unit'
+    ).values_list(
+        'ingredient__name', 'ingredient__measurement_unit', 'amount'
+    ).iterator(chunk_size=CHUNK_SIZE)
+
+
+def render_txt(items):
+    """Список покупок в виде текста."""
+    yield 'Список покупок:\n\n'
+    for name, measurement_unit, total in items:
+        yield f'{name}: {total} {measurement_unit}\n'
+
+
+def render_csv(items):
+    """Список покупок в формате CSV."""
+    writer = csv.writer(Echo())
+    yield writer.writerow(('name', 'measurement_unit', 'amount'))
+    for row in items:
+        yield writer.writerow(row)
+
+
+def render_json(items):
+    """Список покупок в виде JSON-массива."""
+    separator = '['
+    for name, measurement_unit, total in items:
+        yield separator + json.dumps(
+            {'name': name, 'measurement_unit': measurement_unit,
+             'amount': total},
+            ensure_ascii=False)
+        separator = ','
+    yield '[]' if separator == '[' else ']'
+
+
+RENDERERS = {
+    'txt': render_txt,
+    'csv': render_csv,
+    'json': render_json,
+}
@@ -0,0 +1,185 @@
+"""Короткие ссылки на рецепты.
+
+Код ссылки вычисляется из id рецепта: id в base62 и контрольная сумма
+HMAC, поэтому выдача ссылки ничего не пишет в базу, а переход по ней
+проверяется в памяти процесса. Символы контрольной суммы не входят
+в шестнадцатеричный алфавит, так что новые коды не совпадают с кодами
+из семи шестнадцатеричных символов, которые выдавал urlshortner: такие
+коды ищутся в LegacyShortLink.
+
+Переходы считаются в памяти и записываются в Recipe.link_hits пачками.
+"""
+
+import atexit
+import logging
+import re
+import string
+import threading
+import time
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F
+from django.utils.crypto import constant_time_compare, salted_hmac
+
+from .models import LegacyShortLink, Recipe
+
+logger = logging.getLogger(__name__)
+
+ALPHABET = string.digits + string.ascii_lowercase + string.ascii_uppercase
+CHECKSUM_ALPHABET = ''.join(
+    char for char in ALPHABET if char not in string.hexdigits)
+CHECKSUM_LENGTH = 2
+MAX_CODE_LENGTH = 16
+KEY_SALT = 'foods.shortlinks'
+LEGACY_CODE = re.compile(r'[0-9a-f]{7}')
+LEGACY_CACHE_KEY = 'short_link_legacy:{}'
+LEGACY_CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def to_base62(number):
+    """Запись неотрицательного числа в base62."""
+    digits = []
+    while True:
+        number, digit = divmod(number, len(ALPHABET))
+        digits.append(ALPHABET[digit])
+        if not number:
+            return ''.join(reversed(digits))
+
+
+def from_base62(value):
+    """Число из записи в base62 или None для некорректной записи."""
+    if not value or (len(value) > 1 and value[0] == ALPHABET[0]):
+        return None
+    number = 0
+    for char in value:
+        digit = ALPHABET.find(char)
+        if digit < 0:
+            return None
+        number = number * len(ALPHABET) + digit
+    return number
+
+
+def checksum(recipe_id):
+    """Контрольная сумма кода рецепта."""
+    digest = salted_hmac(KEY_SALT, str(recipe_id),
+                         secret=settings.SHORT_LINK_SECRET).digest()
+    number = int.from_bytes(digest[:8], 'big')
+    chars = []
+    for _ in range(CHECKSUM_LENGTH):
+        number, digit = divmod(number, len(CHECKSUM_ALPHABET))
+        chars.append(CHECKSUM_ALPHABET[digit])
+    return ''.join(chars)
+
+
+def encode(recipe_id):
+    """Код короткой ссылки рецепта."""
+    return to_base62(recipe_id) + checksum(recipe_id)
+
+
+def decode(code):
+    """Id рецепта по коду или None, если код не выдавался."""
+    if not CHECKSUM_LENGTH < len(code) <= MAX_CODE_LENGTH:
+        return None
+    recipe_id = from_base62(code[:-CHECKSUM_LENGTH])
+    if recipe_id is None or not constant_time_compare(
+            code[-CHECKSUM_LENGTH:], checksum(recipe_id)):
+        return None
+    return recipe_id
+
+
+def legacy_recipe_id(code):
+    """Id рецепта по коду urlshortner, найденный через кэш."""
+    key = LEGACY_CACHE_KEY.format(code)
+    recipe_id = cache.get(key)
+    if recipe_id is None:
+        recipe_id = LegacyShortLink.objects.filter(code=code).values_list(
+            'recipe_id', flat=True).first() or 0
+        cache.set(key, recipe_id, LEGACY_CACHE_TIMEOUT)
+    return recipe_id or None
+
+
+def resolve(code):
+    """Id рецепта по коду короткой ссылки."""
+    if LEGACY_CODE.fullmatch(code):
+        return legacy_recipe_id(code)
+    return decode(code)
+
+
+def base_url(request):
+    """Адрес сайта, от которого строятся ссылки."""
+    if settings.SHORT_LINK_BASE_URL:
+        return settings.SHORT_LINK_BASE_URL.rstrip('/') + '/'
+    return request.build_absolute_uri('/')
+
+
+def short_link_url(recipe_id, request):
+    """Короткая ссылка на рецепт."""
+    return f'{base_url(request)}s/{encode(recipe_id)}'
+
+
+def recipe_url(recipe_id, request):
+    """Адрес страницы рецепта, куда ведёт короткая ссылка."""
+    return f'{base_url(request)}recipes/{recipe_id}'
+
+
+class HitCounter:
+    """Буфер переходов по коротким ссылкам.
+
+    Переходы копятся в памяти процесса и записываются, когда их
+    набирается SHORT_LINK_FLUSH_SIZE или с прошлой записи прошло
+    SHORT_LINK_FLUSH_INTERVAL секунд. Одна запись делает по одному
+    UPDATE на каждое различное число переходов, а не на каждый рецепт.
+    Переходы, не записанные до остановки процесса, записываются при
+    выходе; при аварийном завершении они теряются.
+    """
+
+    def __init__(self):
+        """Создание пустого буфера."""
+        self._lock = threading.Lock()
+        self._hits = Counter()
+        self._pending = 0
+        self._flushed_at = time.monotonic()
+
+    def add(self, recipe_id):
+        """Учёт перехода по ссылке на рецепт."""
+        with self._lock:
+            self._hits[recipe_id] += 1
+            self._pending += 1
+            if (self._pending < settings.SHORT_LINK_FLUSH_SIZE
+                    and time.monotonic() - self._flushed_at
+                    < settings.SHORT_LINK_FLUSH_INTERVAL):
+                return
+            hits = self._take()
+        self._write(hits)
+
+    def flush(self):
+        """Запись всех накопленных переходов."""
+        with self._lock:
+            hits = self._take()
+        self._write(hits)
+
+    def _take(self):
+        """Извлечение накопленных переходов из буфера."""
+        hits = self._hits
+        self._hits = Counter()
+        self._pending = 0
+        self._flushed_at = time.monotonic()
+        return hits
+
+    def _write(self, hits):
+        """Увеличение link_hits рецептов."""
+        by_delta = defaultdict(list)
+        for recipe_id, delta in hits.items():
+            by_delta[delta].append(recipe_id)
+        try:
+            for delta, recipe_ids in by_delta.items():
+                Recipe.objects.filter(pk__in=recipe_ids).update(
+                    link_hits=F('link_hits') + delta)
+        except Exception:
+            logger.exception('Не удалось записать переходы по ссылкам')
+
+
+hit_counter = HitCounter()
+atexit.register(hit_counter.flush)
@@ -0,0 +1,164 @@
+"""Сигналы."""
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import (m2m_changed, post_delete, post_init,
+                                      post_save)
+from django.dispatch import receiver
+
+from .cache import bump_content_version
+from .counters import schedule_recount
+from .ingredient_index import ingredient_index
+from .models import (Favorites, IngredientRecipe, Ingredients, Recipe,
+                     ShoppingCart, Tag, TagRecipe)
+from .coverage import coverage_index
+from .feed import recipe_published
+from .renditions import schedule_removal, schedule_renditions
+from .search import update_search_vectors
+from .shopping_list import schedule_rebuild
+
+User = get_user_model()
+
+
+@receiver((post_save, post_delete), sender=Ingredients)
+def invalidate_ingredient_index(sender, **kwargs):
+    """Перестроение индекса ингредиентов после изменений."""
+    ingredient_index.invalidate()
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+@receiver((post_save, post_delete), sender=IngredientRecipe)
+@receiver((post_save, post_delete), sender=TagRecipe)
+@receiver((post_save, post_delete), sender=Tag)
+@receiver((post_save, post_delete), sender=Ingredients)
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def invalidate_recipes_cache(sender, **kwargs):
+    """Сброс кэша ответов после изменения рецептов."""
+    transaction.on_commit(bump_content_version)
+
+
+@receiver((post_save, post_delete), sender=User)
+def invalidate_recipes_cache_for_user(sender, update_fields=None, **kwargs):
+    """Сброс кэша ответов после изменения профиля автора."""
+    if update_fields and set(update_fields) <= {'last_login', 'password'}:
+        return
+    transaction.on_commit(bump_content_version)
+
+
+@receiver(post_save, sender=Recipe)
+def build_recipe_image_renditions(sender, instance, **kwargs):
+    """Построение вариантов нового изображения рецепта."""
+    if instance.image and instance.image.name != instance.image_rendered:
+        schedule_renditions(Recipe, instance.pk, 'image', 'image_rendered')
+
+
+@receiver(post_save, sender=User)
+def build_avatar_renditions(sender, instance, **kwargs):
+    """Построение вариантов нового аватара."""
+    if instance.avatar and instance.avatar.name != instance.avatar_rendered:
+        schedule_renditions(User, instance.pk, 'avatar', 'avatar_rendered')
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def remove_recipe_image_renditions(sender, instance, **kwargs):
+    """Удаление вариантов заменённого или удалённого изображения."""
+    schedule_removal(instance.image, instance.image_rendered,
+                     deleted='created' not in kwargs)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def remove_avatar_renditions(sender, instance, **kwargs):
+    """Удаление вариантов заменённого или удалённого аватара."""
+    schedule_removal(instance.avatar, instance.avatar_rendered,
+                     deleted='created' not in kwargs)
+
+
+@receiver(post_save, sender=Recipe)
+def update_recipe_search_vector(sender, instance, **kwargs):
+    """Пересчёт поискового вектора после записи рецепта и ингредиентов."""
+    transaction.on_commit(lambda: update_search_vectors([instance.pk]))
+
+
+@receiver(post_save, sender=Ingredients)
+def update_ingredient_search_vectors(sender, instance, created, **kwargs):
+    """Пересчёт векторов рецептов с переименованным ингредиентом."""
+    if not created:
+        transaction.on_commit(lambda: update_search_vectors(
+            IngredientRecipe.objects.filter(
+                name=instance).values('recipe_id')))
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+def update_coverage_index(sender, instance, **kwargs):
+    """Перечитывание рецепта в индексе покрытия после коммита."""
+    # После удаления instance.pk сбрасывается в None.
+    recipe_ids = [instance.pk]
+    transaction.on_commit(lambda: coverage_index.mark_changed(recipe_ids))
+
+
+@receiver(post_delete, sender=Ingredients)
+def invalidate_coverage_index(sender, **kwargs):
+    """Перестроение индекса покрытия после удаления ингредиента."""
+    coverage_index.invalidate()
+
+
+@receiver(post_save, sender=Recipe)
+def publish_to_timelines(sender, instance, **kwargs):
+    """Раскладка рецепта по готовым лентам подписчиков после коммита."""
+    transaction.on_commit(lambda: recipe_published(instance.pk))
+
+
+@receiver((post_save, post_delete), sender=ShoppingCart)
+def rebuild_user_shopping_list(sender, instance, **kwargs):
+    """Пересчёт списка покупок после изменения корзины через модель."""
+    schedule_rebuild(user_ids=[instance.user_id])
+
+
+@receiver((post_save, post_delete), sender=IngredientRecipe)
+def rebuild_recipe_shopping_lists(sender, instance, **kwargs):
+    """Пересчёт списков покупок с рецептом после изменения ингредиентов."""
+    schedule_rebuild(recipe_ids=[instance.recipe_id])
+
+
+# Поле со ссылкой на объект, у которого модель меняет счётчик.
+COUNTED_OWNERS = {Recipe: 'author_id', Favorites: 'recipe_id'}
+
+
+def schedule_counted_owners(sender, ids):
+    """Планирование пересчёта recipes_count или favorites_count."""
+    if sender is Recipe:
+        schedule_recount(user_ids=ids)
+    else:
+        schedule_recount(recipe_ids=ids)
+
+
+@receiver(post_init, sender=Recipe)
+@receiver(post_init, sender=Favorites)
+def remember_counted_owner(sender, instance, **kwargs):
+    """Автор рецепта или рецепт избранного на момент загрузки.
+
+    Значение берётся из __dict__, чтобы не загружать отложенное поле.
+    """
+    instance._counted_owner = instance.__dict__.get(
+        COUNTED_OWNERS[sender])
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=Favorites)
+def recount_saved_owner(sender, instance, created, **kwargs):
+    """Пересчёт счётчиков при создании объекта или смене владельца."""
+    field = COUNTED_OWNERS[sender]
+    previous, current = instance._counted_owner, getattr(instance, field)
+    if created or (previous is not None and previous != current):
+        schedule_counted_owners(sender, {previous, current} - {None})
+    instance._counted_owner = current
+
+
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=Favorites)
+def recount_deleted_owner(sender, instance, **kwargs):
+    """Пересчёт счётчика владельца удалённого объекта."""
+    schedule_counted_owners(
+        sender, {getattr(instance, COUNTED_OWNERS[sender])})
@@ -0,0 +1,70 @@
+"""Версии наборов данных в базе, общие для всех процессов.
+
+Версия хранится в строке ChangeStamp, а не в кэше: кэш по умолчанию
+свой у каждого процесса, и изменение, сделанное в одном процессе или
+в команде управления, другие процессы не увидели бы. Внутри запроса
+прочитанная версия запоминается, чтобы проверки ETag и индексы не
+читали одну строку несколько раз.
+"""
+
+import threading
+from uuid import uuid4
+
+from django.core.signals import request_finished, request_started
+from django.db import connection
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import ChangeStamp
+
+_local = threading.local()
+
+
+@receiver(request_started)
+def start_request_memo(sender, **kwargs):
+    """Начало запоминания версий на время запроса."""
+    _local.memo = {}
+
+
+@receiver(request_finished)
+def finish_request_memo(sender, **kwargs):
+    """Сброс версий, запомненных за время запроса."""
+    _local.memo = None
+
+
+def get_stamp(name):
+    """Текущая версия набора данных name.
+
+    Пока набор ни разу не менялся, строки нет и версия пустая.
+    """
+    memo = getattr(_local, 'memo', None)
+    if memo is not None and name in memo:
+        return memo[name]
+    version = ChangeStamp.objects.filter(name=name).values_list(
+        'version', flat=True).first() or ''
+    if memo is not None:
+        memo[name] = version
+    return version
+
+
+def bump_stamp(name):
+    """Смена версии набора данных name одним INSERT ... ON CONFLICT."""
+    version = uuid4().hex
+    quote = connection.ops.quote_name
+    meta = ChangeStamp._meta
+    name_column, version_column, changed_column = (
+        quote(meta.get_field(field).column)
+        for field in ('name', 'version', 'changed_at'))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {quote(meta.db_table)} '
+            f'({name_column}, {version_column}, {changed_column}) '
+            f'VALUES (%s, %s, %s) '
+            f'ON CONFLICT ({name_column}) DO UPDATE SET '
+            f'{version_column} = EXCLUDED.{version_column}, '
+            f'{changed_column} = EXCLUDED.{changed_column}',
+            (name, version, timezone.now()))
+    memo = getattr(_local, 'memo', None)
+    if memo is not None:
+        memo[name] = version
+    return version
@@ -0,0 +1,41 @@
+"""Кэш ответов для анонимных пользователей."""
+
+from foods.cache import bump_content_version
+from foods.models import Recipe
+
+from .utils import APITestCase, create_recipe, create_user
+
+
+class AnonymousCacheTests(APITestCase):
+    """Кэшированный ответ сбрасывается сменой версий данных."""
+
+    def setUp(self):
+        super().setUp()
+        self.author = create_user('author')
+        self.recipe = create_recipe(self.author, 'Борщ')
+        self.path = f'/api/recipes/{self.recipe.pk}/'
+
+    def test_response_cached_until_content_version_changes(self):
+        self.assertEqual(self.anonymous.get(self.path).data['name'], 'Борщ')
+        # update() не отправляет сигналы и версию не меняет.
+        Recipe.objects.filter(pk=self.recipe.pk).update(name='Щи')
+        self.assertEqual(self.anonymous.get(self.path).data['name'], 'Борщ')
+        bump_content_version()
+        self.assertEqual(self.anonymous.get(self.path).data['name'], 'Щи')
+
+    def test_authenticated_responses_not_cached(self):
+        client = self.client_for(self.author)
+        client.get(self.path)
+        Recipe.objects.filter(pk=self.recipe.pk).update(name='Щи')
+        self.assertEqual(client.get(self.path).data['name'], 'Щи')
+
+    def test_favorite_refreshes_cached_count(self):
+        for path in (self.path, '/api/recipes/'):
+            self.anonymous.get(path)
+        fan = self.client_for(create_user('fan'))
+        with self.captureOnCommitCallbacks(execute=True):
+            fan.post(f'/api/recipes/{self.recipe.pk}/favorite/')
+        self.assertEqual(
+            self.anonymous.get(self.path).data['favorites_count'], 1)
+        self.assertEqual(self.anonymous.get('/api/recipes/').data[
+            'results'][0]['favorites_count'], 1)
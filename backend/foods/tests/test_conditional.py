@@ -0,0 +1,60 @@
+"""Условные GET-запросы к рецептам."""
+
+from foods.models import Favorites
+
+from .utils import APITestCase, create_recipe, create_user
+
+
+class ConditionalResponseTests(APITestCase):
+    """ETag меняется вместе с рецептами, избранным и связями зрителя."""
+
+    def setUp(self):
+        super().setUp()
+        self.author = create_user('author')
+        self.viewer = create_user('viewer')
+        self.recipe = create_recipe(self.author, 'Борщ')
+        self.client = self.client_for(self.viewer)
+
+    def etag(self, client, path):
+        """ETag ответа 200 на GET path."""
+        response = client.get(path)
+        self.assertEqual(response.status_code, 200)
+        return response['ETag']
+
+    def assertModified(self, client, path, etag):
+        response = client.get(path, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_not_modified_without_last_modified(self):
+        for path in ('/api/recipes/', f'/api/recipes/{self.recipe.pk}/'):
+            with self.subTest(path=path):
+                response = self.anonymous.get(path)
+                self.assertNotIn('Last-Modified', response)
+                repeated = self.anonymous.get(
+                    path, HTTP_IF_NONE_MATCH=response['ETag'])
+                self.assertEqual(repeated.status_code, 304)
+
+    def test_recipe_change_modifies_list_and_detail(self):
+        paths = ('/api/recipes/', f'/api/recipes/{self.recipe.pk}/')
+        etags = [self.etag(self.anonymous, path) for path in paths]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.recipe.text = 'Новый текст'
+            self.recipe.save()
+        for path, etag in zip(paths, etags):
+            with self.subTest(path=path):
+                self.assertModified(self.anonymous, path, etag)
+
+    def test_favorite_modifies_anonymous_etag(self):
+        path = f'/api/recipes/{self.recipe.pk}/'
+        etag = self.etag(self.anonymous, path)
+        other = self.client_for(create_user('other'))
+        with self.captureOnCommitCallbacks(execute=True):
+            other.post(f'/api/recipes/{self.recipe.pk}/favorite/')
+        self.assertModified(self.anonymous, path, etag)
+
+    def test_viewer_relations_modify_etag(self):
+        path = '/api/recipes/'
+        etag = self.etag(self.client, path)
+        Favorites.objects.create(user=self.viewer, recipe=self.recipe)
+        self.assertModified(self.client, path, etag)
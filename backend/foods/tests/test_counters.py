@@ -0,0 +1,77 @@
+"""Счётчики favorites_count и recipes_count."""
+
+from foods.models import Favorites, Recipe
+
+from .utils import APITestCase, create_recipe, create_user
+
+
+class CounterTests(APITestCase):
+    """Счётчики следуют за изменениями через API и через модели."""
+
+    def setUp(self):
+        super().setUp()
+        self.author = create_user('author')
+        self.fan = create_user('fan')
+        self.recipe = create_recipe(self.author, 'Борщ')
+
+    def favorites_count(self, recipe=None):
+        return Recipe.objects.get(pk=(recipe or self.recipe).pk
+                                  ).favorites_count
+
+    def recipes_count(self, user=None):
+        user = user or self.author
+        return type(user).objects.get(pk=user.pk).recipes_count
+
+    def test_recipe_create_counted_by_signal(self):
+        # Рецепт из setUp создан без обработчиков on_commit, пересчёт
+        # после нового рецепта учитывает оба.
+        self.assertEqual(self.recipes_count(), 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            create_recipe(self.author, 'Щи')
+        self.assertEqual(self.recipes_count(), 2)
+
+    def test_api_favorite_toggle(self):
+        client = self.client_for(self.fan)
+        path = f'/api/recipes/{self.recipe.pk}/favorite/'
+        self.assertEqual(client.post(path).status_code, 201)
+        self.assertEqual(self.favorites_count(), 1)
+        self.assertEqual(client.delete(path).status_code, 204)
+        self.assertEqual(self.favorites_count(), 0)
+
+    def test_model_favorites(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            favorite = Favorites.objects.create(user=self.fan,
+                                                recipe=self.recipe)
+        self.assertEqual(self.favorites_count(), 1)
+        other = create_recipe(self.author, 'Щи')
+        with self.captureOnCommitCallbacks(execute=True):
+            favorite.recipe = other
+            favorite.save()
+        self.assertEqual(self.favorites_count(), 0)
+        self.assertEqual(self.favorites_count(other), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            favorite.delete()
+        self.assertEqual(self.favorites_count(other), 0)
+
+    def test_author_change_moves_recipe(self):
+        new_author = create_user('new_author')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.recipe.author = new_author
+            self.recipe.save()
+        self.assertEqual(self.recipes_count(), 0)
+        self.assertEqual(self.recipes_count(new_author), 1)
+
+    def test_user_delete_cascades_favorites(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Favorites.objects.create(user=self.fan, recipe=self.recipe)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.fan.delete()
+        self.assertEqual(self.favorites_count(), 0)
+
+    def test_stale_save_keeps_counter(self):
+        stale = Recipe.objects.get(pk=self.recipe.pk)
+        self.client_for(self.fan).post(
+            f'/api/recipes/{self.recipe.pk}/favorite/')
+        stale.name = 'Щи'
+        stale.save()
+        self.assertEqual(self.favorites_count(), 1)
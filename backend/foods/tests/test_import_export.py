@@ -0,0 +1,102 @@
+"""Выгрузка и загрузка рецептов в NDJSON."""
+
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+
+from foods.models import IngredientRecipe, Ingredients, Recipe
+
+from .utils import APITestCase, create_recipe, create_tag, create_user
+
+
+class ImportExportTests(APITestCase):
+    """export_recipes и import_recipes переносят рецепты без потерь."""
+
+    def setUp(self):
+        super().setUp()
+        self.author = create_user('author')
+        self.salt = Ingredients.objects.create(name='Соль',
+                                               measurement_unit='г')
+        self.beet = Ingredients.objects.create(name='Свёкла',
+                                               measurement_unit='шт')
+        self.soup = create_tag('soup')
+        create_recipe(self.author, 'Борщ', text='Варить',
+                      ingredients=[(self.salt, 5), (self.beet, 2)],
+                      tags=[self.soup])
+        create_recipe(self.author, 'Салат', ingredients=[(self.beet, 1)])
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'recipes.ndjson')
+
+    def call(self, name, *args):
+        output = StringIO()
+        call_command(name, *args, stdout=output, stderr=StringIO())
+        return output.getvalue()
+
+    def snapshot(self):
+        """Рецепты с ингредиентами и тегами в сравнимом виде."""
+        return sorted(
+            (recipe.name, recipe.text, recipe.cooking_time,
+             recipe.author.email,
+             sorted(IngredientRecipe.objects.filter(
+                 recipe=recipe).values_list('name__name', 'amount')),
+             sorted(recipe.tags.values_list('slug', flat=True)))
+            for recipe in Recipe.objects.select_related('author'))
+
+    def write_lines(self, *items):
+        with open(self.path, 'w', encoding='utf-8') as output:
+            for item in items:
+                output.write(json.dumps(item, ensure_ascii=False) + '\n')
+
+    def test_round_trip(self):
+        expected = self.snapshot()
+        self.call('export_recipes', self.path)
+        Recipe.objects.all().delete()
+        self.call('import_recipes', self.path, '--batch-size', '1')
+        self.assertEqual(self.snapshot(), expected)
+        self.assertFalse(os.path.exists(f'{self.path}.checkpoint'))
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.recipes_count, 2)
+
+    def test_existing_recipes_skipped(self):
+        self.call('export_recipes', self.path)
+        output = self.call('import_recipes', self.path)
+        self.assertIn('пропущено существующих: 2', output)
+        self.assertEqual(Recipe.objects.count(), 2)
+
+    def test_repeated_ingredients_merged(self):
+        ingredient = {'name': 'Соль', 'measurement_unit': 'г'}
+        self.write_lines({
+            'name': 'Щи', 'text': 'Варить', 'cooking_time': 30,
+            'image': None, 'author': self.author.email,
+            'ingredients': [dict(ingredient, amount=1),
+                            dict(ingredient, amount=4)],
+            'tags': ['soup', 'soup'],
+        })
+        self.call('import_recipes', self.path)
+        recipe = Recipe.objects.get(name='Щи')
+        self.assertEqual(
+            list(IngredientRecipe.objects.filter(
+                recipe=recipe).values_list('name__name', 'amount')),
+            [('Соль', 5)])
+        self.assertEqual(list(recipe.tags.values_list('slug', flat=True)),
+                         ['soup'])
+
+    def test_new_ingredients_refresh_catalog(self):
+        response = self.anonymous.get('/api/ingredients/')
+        self.assertEqual(len(response.data), 2)
+        self.write_lines({
+            'name': 'Щи', 'text': 'Варить', 'cooking_time': 30,
+            'image': None, 'author': self.author.email,
+            'ingredients': [{'name': 'Капуста', 'measurement_unit': 'г',
+                             'amount': 300}],
+            'tags': [],
+        })
+        self.call('import_recipes', self.path)
+        refreshed = self.anonymous.get('/api/ingredients/',
+                                       HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(refreshed.status_code, 200)
+        self.assertEqual(len(refreshed.data), 3)
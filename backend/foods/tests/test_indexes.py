@@ -0,0 +1,22 @@
+"""Проверка планов запросов поиска по названию."""
+
+from unittest import skipUnless
+
+from django.db import connection
+from django.test import TestCase
+
+from foods.management.commands.check_query_budget import INDEX_LOOKUPS
+
+
+@skipUnless(connection.vendor == 'postgresql',
+            'Функциональные индексы создаются только на PostgreSQL.')
+class NameIndexTests(TestCase):
+    """Поиск по названию без учёта регистра идёт по индексам 0008."""
+
+    def test_lookups_use_indexes(self):
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+        for model, lookup, index in INDEX_LOOKUPS:
+            with self.subTest(model=model.__name__, lookup=lookup):
+                plan = model.objects.filter(**{lookup: 'ингр'}).explain()
+                self.assertIn(index, plan)
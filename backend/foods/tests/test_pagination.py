@@ -0,0 +1,60 @@
+"""Выбор пагинатора списка рецептов."""
+
+from foods.models import Ingredients
+
+from .utils import APITestCase, create_recipe, create_user
+
+
+class PaginatorSwitchTests(APITestCase):
+    """Постраничная пагинация по умолчанию и курсор по ?pagination=cursor."""
+
+    def setUp(self):
+        super().setUp()
+        self.author = create_user('author')
+        self.salt = Ingredients.objects.create(name='Соль',
+                                               measurement_unit='г')
+        self.recipes = [
+            create_recipe(self.author, f'Рецепт {number}',
+                          ingredients=[(self.salt, 5)])
+            for number in range(7)
+        ]
+
+    def collect(self, params):
+        """id рецептов со всех страниц курсорной пагинации."""
+        ids = []
+        response = self.anonymous.get('/api/recipes/', params)
+        while True:
+            self.assertEqual(response.status_code, 200)
+            ids += [recipe['id'] for recipe in response.data['results']]
+            if not response.data['next']:
+                return ids
+            response = self.anonymous.get(response.data['next'])
+
+    def test_page_number_by_default(self):
+        response = self.anonymous.get('/api/recipes/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 7)
+        self.assertEqual(len(response.data['results']), 5)
+
+    def test_cursor_pages_without_count(self):
+        response = self.anonymous.get('/api/recipes/',
+                                      {'pagination': 'cursor', 'limit': 3})
+        self.assertNotIn('count', response.data)
+        ids = self.collect({'pagination': 'cursor', 'limit': 3})
+        self.assertEqual(ids, sorted(
+            (recipe.pk for recipe in self.recipes), reverse=True))
+
+    def test_search_cursor_orders_by_rank(self):
+        in_text = create_recipe(self.author, 'Суп', text='Борщ на обед')
+        in_name = create_recipe(self.author, 'Борщ', text='Свёкла')
+        ids = self.collect({'pagination': 'cursor', 'limit': 1,
+                            'search': 'борщ'})
+        self.assertEqual(ids, [in_name.pk, in_text.pk])
+
+    def test_what_to_cook_ignores_cursor(self):
+        response = self.anonymous.get(
+            '/api/recipes/what-to-cook/',
+            {'ingredients': self.salt.pk, 'pagination': 'cursor'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 7)
+        self.assertEqual(len(response.data['results']), 5)
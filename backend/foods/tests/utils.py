@@ -0,0 +1,59 @@
+"""Общие объекты тестов API."""
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from foods.cache import bump_content_version
+from foods.coverage import coverage_index
+from foods.ingredient_index import ingredient_index
+from foods.models import IngredientRecipe, Recipe, Tag, TagRecipe
+
+User = get_user_model()
+
+
+def create_user(name):
+    """Пользователь с email и именем из name."""
+    return User.objects.create(email=f'{name}@example.com', username=name,
+                               first_name=name, last_name=name)
+
+
+def create_recipe(author, name, ingredients=(), tags=(), text='Текст'):
+    """Рецепт без изображения с ингредиентами [(ингредиент, количество)]."""
+    recipe = Recipe.objects.create(author=author, name=name, text=text,
+                                   cooking_time=10, image='')
+    IngredientRecipe.objects.bulk_create(
+        IngredientRecipe(recipe=recipe, name=ingredient, amount=amount)
+        for ingredient, amount in ingredients)
+    TagRecipe.objects.bulk_create(
+        TagRecipe(recipe=recipe, name=tag) for tag in tags)
+    return recipe
+
+
+def create_tag(slug):
+    """Тег со слагом slug."""
+    return Tag.objects.create(name=slug, slug=slug)
+
+
+class APITestCase(TestCase):
+    """Тест API с чистыми кэшами и индексами в памяти процесса.
+
+    Откат транзакции теста возвращает версии ChangeStamp к прежним
+    значениям, а кэш и индексы живут дольше теста, поэтому перед каждым
+    тестом версии меняются заново.
+    """
+
+    def setUp(self):
+        """Сброс кэша ответов и индексов."""
+        cache.clear()
+        bump_content_version()
+        ingredient_index.invalidate()
+        coverage_index.invalidate()
+        self.anonymous = APIClient()
+
+    def client_for(self, user):
+        """Клиент API, вошедший как user."""
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
@@ -0,0 +1,28 @@
+"""Поля моделей, которые меняются только UPDATE по первичному ключу."""
+
+
+class UpdateOnlyFieldsMixin:
+    """Сохранение изменённого объекта без полей UPDATE_ONLY_FIELDS.
+
+    Счётчики меняются UPDATE с F(), отметки о вариантах изображений -
+    фоновой задачей. Экземпляр, загруженный до такого изменения, при
+    полном save() записал бы в эти поля устаревшие значения, поэтому
+    при обновлении без явных update_fields они не сохраняются. Новые
+    объекты сохраняются целиком.
+    """
+
+    UPDATE_ONLY_FIELDS = ()
+
+    def save(self, *args, **kwargs):
+        """Сохранение с update_fields без полей UPDATE_ONLY_FIELDS."""
+        if (not args and not self._state.adding
+                and kwargs.get('update_fields') is None
+                and not kwargs.get('force_insert')):
+            deferred = self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.UPDATE_ONLY_FIELDS
+                and field.attname not in deferred
+            ]
+        super().save(*args, **kwargs)
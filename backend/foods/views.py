@@ -1,26 +1,53 @@
 """Views.py."""
 
-from django.db.models import Sum
-from django.shortcuts import HttpResponse, get_object_or_404
+from django.db import transaction
+from django.http import Http404, HttpResponseRedirect, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.views.decorators.http import require_safe
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.response import Response
 from rest_framework import exceptions, status, viewsets
 from rest_framework.decorators import action
+from rest_framework.parsers import FormParser, JSONParser, MultiPartParser
 from rest_framework.permissions import SAFE_METHODS, AllowAny, IsAuthenticated
+from rest_framework.renderers import JSONRenderer
 
+from .cache import cache_anonymous_response, get_content_version
+from .conditional import conditional_response
+from .coverage import coverage_index
+from .feed import ensure_timeline, followed_recipes, uses_timeline
+from .counters import (count_favorites_added, count_favorites_removed,
+                       get_favorites_version)
 from .filters import IngredientFilter, RecipeFilter
+from .pagination import (FeedEntryCursorPagination, RecipeCursorPagination,
+                         RecipeSearchCursorPagination)
+from .parsers import ImageUploadParser, image_upload_data
+from .ingredient_index import ingredient_index
+from .shopping_list import (RENDERERS, add_recipes_to_shopping_list,
+                            change_recipe_in_shopping_lists, recipe_amounts,
+                            remove_recipes_from_shopping_list,
+                            shopping_list_items,
+                            shopping_lists_updated_explicitly)
 from .models import (
     Favorites,
+    FeedEntry,
     Ingredients,
-    IngredientRecipe,
     Recipe,
     ShoppingCart,
     Tag,
 )
+from .relations import (add_relation, add_relations, remove_relation,
+                        remove_relations)
+from .renderers import CSVRenderer, PlainTextRenderer
+from .shortlinks import hit_counter, recipe_url, resolve
 from .serializers import (
+    CoverageQuerySerializer,
     FavoriteOrShoppingCartSerializer,
     FavoriteSerializer,
     IngredientsSerializers,
+    RecipeIdsSerializer,
+    RecipeImageSerializer,
+    RecipeCoverageSerializer,
     RecipeListSerializers,
     RecipeShortLink,
     RecipeWriteSerializers,
@@ -28,6 +55,27 @@ from .serializers import (
 )
 
 
+def recipe_validators(view, request, *args, **kwargs):
+    """Версии содержимого рецептов и избранного.
+
+    Создание, изменение и удаление рецептов меняют версию содержимого,
+    добавление в избранное - версию избранного, поэтому рецепты для
+    ETag не читаются. Last-Modified не отдаётся: дата публикации не
+    меняется ни при редактировании, ни при добавлении в избранное.
+    """
+    return (get_content_version(), get_favorites_version()), None
+
+
+def content_validators(view, request, *args, **kwargs):
+    """Версия содержимого рецептов и тегов."""
+    return (get_content_version(),), None
+
+
+def ingredient_validators(view, request, *args, **kwargs):
+    """Версия каталога ингредиентов."""
+    return (ingredient_index.version(),), None
+
+
 class RecipeListView(viewsets.ModelViewSet):
     """Viewset рецептов."""
 
@@ -36,6 +84,43 @@ class RecipeListView(viewsets.ModelViewSet):
     filter_backends = (DjangoFilterBackend, )
     filterset_class = RecipeFilter
 
+    @property
+    def paginator(self):
+        """Курсорная пагинация по запросу ?pagination=cursor.
+
+        Результаты поиска листаются в порядке ранга, остальные списки -
+        по дате публикации.
+        """
+        if not hasattr(self, '_paginator'):
+            params = self.request.query_params
+            if params.get('pagination') != 'cursor':
+                self._paginator = self.pagination_class()
+            elif params.get('search', '').strip():
+                self._paginator = RecipeSearchCursorPagination()
+            else:
+                self._paginator = RecipeCursorPagination()
+        return self._paginator
+
+    def get_queryset(self):
+        """Получение рецептов с подгруженными связями."""
+        queryset = super().get_queryset()
+        if self.request.method in SAFE_METHODS:
+            queryset = queryset.with_related().with_user_flags(
+                self.request.user)
+        return queryset
+
+    @conditional_response(recipe_validators)
+    @cache_anonymous_response
+    def list(self, request, *args, **kwargs):
+        """Список рецептов."""
+        return super().list(request, *args, **kwargs)
+
+    @conditional_response(recipe_validators)
+    @cache_anonymous_response
+    def retrieve(self, request, *args, **kwargs):
+        """Рецепт."""
+        return super().retrieve(request, *args, **kwargs)
+
     def get_serializer_class(self):
         """Получение определенного сериализатора."""
         if self.request.method in SAFE_METHODS:
@@ -46,12 +131,35 @@ class RecipeListView(viewsets.ModelViewSet):
         """Присвоение автору рецепта пользователя."""
         serializer.save(author=self.request.user)
 
+    def perform_destroy(self, instance):
+        """Удаление рецепта из списков покупок вместе с рецептом."""
+        with transaction.atomic(), shopping_lists_updated_explicitly():
+            change_recipe_in_shopping_lists(
+                instance, recipe_amounts(instance), {})
+            instance.delete()
+
+    @action(detail=True, methods=['put'],
+            permission_classes=[IsAuthenticated],
+            parser_classes=[JSONParser, MultiPartParser, FormParser,
+                            ImageUploadParser])
+    def image(self, request, pk=None):
+        """Замена изображения рецепта файлом или base64."""
+        recipe = get_object_or_404(Recipe, pk=pk)
+        if recipe.author_id != request.user.id:
+            raise exceptions.PermissionDenied()
+        serializer = RecipeImageSerializer(
+            recipe, data=image_upload_data(request, 'image'),
+            context={'request': request})
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        return Response(serializer.data)
+
     @action(detail=True,
             methods=['get'],
             url_path='get-link')
     def get_link(self, request, pk=None):
         """Получение короткой ссылки."""
-        recipe = get_object_or_404(Recipe, pk=pk)
+        recipe = get_object_or_404(Recipe.objects.only('id'), pk=pk)
         serializer = RecipeShortLink(recipe, context={'request': request})
         return Response(serializer.data)
 
@@ -59,50 +167,165 @@ class RecipeListView(viewsets.ModelViewSet):
             permission_classes=[IsAuthenticated])
     def shopping_cart(self, request, pk):
         """Добавление в список покупок."""
-        recipe = get_object_or_404(Recipe, pk=pk)
         if request.method == 'POST':
-            if ShoppingCart.objects.filter(user=request.user,
-                                           recipe=recipe).exists():
+            with transaction.atomic():
+                created = add_relation(ShoppingCart, request.user,
+                                       'recipe', pk)
+                if created:
+                    add_recipes_to_shopping_list(request.user, pk)
+            if created is None:
+                raise exceptions.NotFound()
+            if not created:
                 raise exceptions.ValidationError(
                     'Рецепт уже добавлен в список покупок.'
                 )
-            ShoppingCart.objects.create(user=request.user, recipe=recipe)
             serializer = FavoriteOrShoppingCartSerializer(
-                recipe, context={'request': request}
+                Recipe.objects.get(pk=pk), context={'request': request}
             )
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         elif request.method == "DELETE":
-            if not ShoppingCart.objects.filter(user=request.user,
-                                               recipe=recipe).exists():
+            with transaction.atomic():
+                deleted = remove_relation(ShoppingCart, request.user,
+                                          'recipe', pk)
+                if deleted:
+                    remove_recipes_from_shopping_list(request.user, pk)
+            if deleted is None:
+                raise exceptions.NotFound()
+            if not deleted:
                 raise exceptions.ValidationError(
                     'Рецепта нет в списке покупок.'
                 )
-            shopping_cart = get_object_or_404(
-                ShoppingCart,
-                user=request.user,
-                recipe=recipe
-            )
-            shopping_cart.delete()
             return Response(status=status.HTTP_204_NO_CONTENT)
 
-    @action(detail=False, methods=['get'])
+    def change_relations(self, request, model, on_added=None,
+                         on_removed=None):
+        """Пакетное добавление или удаление связей с рецептами.
+
+        Возвращает итог для каждого переданного id: created или exists
+        при добавлении, deleted или missing при удалении, not_found,
+        если рецепта нет.
+        """
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = list(dict.fromkeys(serializer.validated_data['recipes']))
+        found = list(Recipe.objects.only('id').in_bulk(ids))
+        with transaction.atomic():
+            if request.method == 'POST':
+                changed = add_relations(model, request.user, 'recipe', found)
+                if on_added:
+                    on_added(request.user, *changed)
+                done, skipped = 'created', 'exists'
+            else:
+                changed = remove_relations(model, request.user, 'recipe',
+                                           found)
+                if on_removed:
+                    on_removed(request.user, *changed)
+                done, skipped = 'deleted', 'missing'
+        found = set(found)
+        return Response({'results': [
+            {'id': pk,
+             'status': (done if pk in changed
+                        else skipped if pk in found else 'not_found')}
+            for pk in ids
+        ]})
+
+    @action(detail=False, methods=['post', 'delete'],
+            permission_classes=[IsAuthenticated],
+            url_path='shopping_cart', url_name='shopping-cart-bulk')
+    def shopping_cart_bulk(self, request):
+        """Пакетное добавление и удаление рецептов в списке покупок."""
+        return self.change_relations(request, ShoppingCart,
+                                     add_recipes_to_shopping_list,
+                                     remove_recipes_from_shopping_list)
+
+    @action(detail=False, methods=['post', 'delete'],
+            permission_classes=[IsAuthenticated],
+            url_path='favorite', url_name='favorite-bulk')
+    def favorite_bulk(self, request):
+        """Пакетное добавление и удаление рецептов в избранном."""
+        return self.change_relations(request, Favorites,
+                                     count_favorites_added,
+                                     count_favorites_removed)
+
+    @action(detail=False, methods=['get'],
+            permission_classes=[IsAuthenticated])
+    def feed(self, request):
+        """Новые рецепты авторов, на которых подписан пользователь.
+
+        Страницы отдаются по курсору в порядке (pub_date, id) от новых
+        к старым, как ?pagination=cursor в списке рецептов.
+        """
+        user = request.user
+        recipes = Recipe.objects.with_related().with_user_flags(user)
+        if uses_timeline(user):
+            ensure_timeline(user)
+            paginator = FeedEntryCursorPagination()
+            entries = paginator.paginate_queryset(
+                FeedEntry.objects.filter(user=user).only(
+                    'id', 'recipe_id', 'pub_date'),
+                request, view=self)
+            found = recipes.in_bulk([entry.recipe_id for entry in entries])
+            page = [found[entry.recipe_id] for entry in entries
+                    if entry.recipe_id in found]
+        else:
+            paginator = RecipeCursorPagination()
+            page = paginator.paginate_queryset(
+                recipes & followed_recipes(user), request, view=self)
+        serializer = RecipeListSerializers(
+            page, many=True, context=self.get_serializer_context())
+        return paginator.get_paginated_response(serializer.data)
+
+    @action(detail=False, methods=['get'], url_path='what-to-cook')
+    def what_to_cook(self, request):
+        """Рецепты по доле ингредиентов, которые есть у пользователя.
+
+        ?ingredients=1&ingredients=2 - имеющиеся ингредиенты, ?tags=
+        ограничивает теги, ?min_coverage= - минимальная доля от 0 до 1.
+        Результат - список в памяти, поэтому ?pagination=cursor не
+        поддерживается и всегда используется постраничная пагинация.
+        """
+        serializer = CoverageQuerySerializer(data={
+            'ingredients': request.query_params.getlist('ingredients'),
+            'tags': request.query_params.getlist('tags'),
+            'min_coverage': request.query_params.get('min_coverage', 0),
+        })
+        serializer.is_valid(raise_exception=True)
+        params = serializer.validated_data
+        tag_ids = None
+        if params.get('tags'):
+            tag_ids = set(Tag.objects.filter(
+                slug__in=params['tags']).values_list('id', flat=True))
+        matches = coverage_index.match(
+            params['ingredients'], tag_ids, params['min_coverage'])
+        paginator = self.pagination_class()
+        page = paginator.paginate_queryset(matches, request, view=self)
+        recipes = Recipe.objects.with_related().with_user_flags(
+            request.user).in_bulk([row[0] for row in page])
+        results = []
+        for recipe_id, coverage, matched, total in page:
+            recipe = recipes.get(recipe_id)
+            if recipe is None:
+                continue
+            recipe.coverage = round(coverage, 4)
+            recipe.matched_ingredients = matched
+            recipe.total_ingredients = total
+            results.append(recipe)
+        return paginator.get_paginated_response(RecipeCoverageSerializer(
+            results, many=True, context=self.get_serializer_context()
+        ).data)
+
+    @action(detail=False, methods=['get'],
+            permission_classes=[IsAuthenticated],
+            renderer_classes=[PlainTextRenderer, CSVRenderer, JSONRenderer])
     def download_shopping_cart(self, request):
-        """Скачивание списка покупок."""
-        shopping_list = IngredientRecipe.objects.filter(
-            recipe__carts__user=request.user
-        ).values(
-            'name__name', 'name__measurement_unit'
-        ).annotate(name_total=Sum('amount'))
-
-        text = 'Список покупок:\n\n'
-        for item in shopping_list:
-            text += (
-                f'{item["name__name"]}: {item["name_total"]}'
-                f' {item["name__measurement_unit"]}\n'
-            )
-        response = HttpResponse(text, content_type='text/plain')
+        """Скачивание списка покупок в формате txt, csv или json."""
+        renderer = request.accepted_renderer
+        response = StreamingHttpResponse(
+            RENDERERS[renderer.format](shopping_list_items(request.user)),
+            content_type=f'{renderer.media_type}; charset=utf-8',
+        )
         response['Content-Disposition'] = (
-            'attachment; filename="shopping_list.txt"'
+            f'attachment; filename="shopping_list.{renderer.format}"'
         )
         return response
 
@@ -112,25 +335,31 @@ class RecipeListView(viewsets.ModelViewSet):
             )
     def favorite(self, request, pk):
         """Добавление удаление избранного."""
-        recipe = get_object_or_404(Recipe, pk=pk)
         user = request.user
         if request.method == "POST":
-            if Favorites.objects.filter(user=user,
-                                        recipe=recipe).exists():
+            with transaction.atomic():
+                created = add_relation(Favorites, user, 'recipe', pk)
+                if created:
+                    count_favorites_added(user, pk)
+            if created is None:
+                raise exceptions.NotFound()
+            if not created:
                 return Response({'errors': 'Ошибка добавления'},
                                 status=status.HTTP_400_BAD_REQUEST)
-            serializer = FavoriteSerializer(data=request.data)
-            if serializer.is_valid(raise_exception=True):
-                serializer.save(user=user, recipe=recipe)
-                return Response(serializer.data,
-                                status=status.HTTP_201_CREATED)
-            return Response(serializer.errors,
-                            status=status.HTTP_400_BAD_REQUEST)
+            serializer = FavoriteSerializer(
+                Favorites(user=user, recipe=Recipe.objects.get(pk=pk)))
+            return Response(serializer.data,
+                            status=status.HTTP_201_CREATED)
 
-        if not Favorites.objects.filter(user=user, recipe=recipe).exists():
+        with transaction.atomic():
+            deleted = remove_relation(Favorites, user, 'recipe', pk)
+            if deleted:
+                count_favorites_removed(user, pk)
+        if deleted is None:
+            raise exceptions.NotFound()
+        if not deleted:
             return Response({'errors': 'Объект не найден'},
                             status=status.HTTP_400_BAD_REQUEST)
-        Favorites.objects.get(recipe=recipe).delete()
         return Response('Рецепт успешно удалён из избранного.',
                         status=status.HTTP_204_NO_CONTENT)
 
@@ -143,6 +372,16 @@ class TagsListView(viewsets.ModelViewSet):
     pagination_class = None
     permission_classes = []
 
+    @conditional_response(content_validators)
+    def list(self, request, *args, **kwargs):
+        """Список тегов."""
+        return super().list(request, *args, **kwargs)
+
+    @conditional_response(content_validators)
+    def retrieve(self, request, *args, **kwargs):
+        """Тег."""
+        return super().retrieve(request, *args, **kwargs)
+
 
 class IngredientsListView(viewsets.ReadOnlyModelViewSet):
     """ViewSet ингредиентов."""
@@ -153,3 +392,28 @@ class IngredientsListView(viewsets.ReadOnlyModelViewSet):
     permission_classes = []
     filter_backends = (DjangoFilterBackend,)
     filterset_class = IngredientFilter
+
+    @conditional_response(ingredient_validators)
+    def list(self, request, *args, **kwargs):
+        """Поиск ингредиентов по индексу в памяти без запросов к БД."""
+        name = request.query_params.get('name')
+        if name:
+            return Response(ingredient_index.search(name))
+        return Response(ingredient_index.all())
+
+    @conditional_response(ingredient_validators)
+    def retrieve(self, request, *args, **kwargs):
+        """Ингредиент."""
+        return super().retrieve(request, *args, **kwargs)
+
+
+@require_safe
+def short_link_redirect(request, code):
+    """Переход по короткой ссылке на страницу рецепта."""
+    recipe_id = resolve(code)
+    if recipe_id is None:
+        raise Http404
+    hit_counter.add(recipe_id)
+    response = HttpResponseRedirect(recipe_url(recipe_id, request))
+    response['Cache-Control'] = 'no-cache'
+    return response
@@ -2,13 +2,20 @@
 
 from django.contrib import admin
 
+from foods.pagination import EstimatedCountPaginator
+
 from .models import MyUser
 
 
 class UserAdmin(admin.ModelAdmin):
     """Панель пользователей."""
 
-    search_fields = ('first_name', 'email')
+    list_display = ('username', 'email', 'first_name', 'last_name',
+                    'recipes_count')
+    readonly_fields = ('recipes_count', 'avatar_rendered')
+    search_fields = ('username', 'first_name', 'email')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 admin.site.register(MyUser, UserAdmin)
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0004_alter_myuser_avatar_alter_myuser_first_name_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='myuser',
+            name='recipes_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Количество рецептов'),
+        ),
+    ]
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0005_myuser_recipes_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='myuser',
+            name='avatar_rendered',
+            field=models.CharField(blank=True, default='', max_length=100, verbose_name='Аватар с вариантами'),
+        ),
+    ]
@@ -4,8 +4,10 @@ from django.contrib.auth.models import AbstractUser
 from django.db import models
 from django.utils.translation import gettext_lazy as _
 
+from foods.update_only import UpdateOnlyFieldsMixin
 
-class MyUser(AbstractUser):
+
+class MyUser(UpdateOnlyFieldsMixin, AbstractUser):
     """Кастомная модель пользователя."""
 
     MAX_EMAIL_LENGTH = 254
@@ -23,6 +25,13 @@ class MyUser(AbstractUser):
                                   max_length=MAX_LENGTH_DEFAULT)
     last_name = models.CharField(verbose_name='Фамилия',
                                  max_length=MAX_LENGTH_DEFAULT)
+    recipes_count = models.PositiveIntegerField('Количество рецептов',
+                                                default=0)
+    avatar_rendered = models.CharField('Аватар с вариантами',
+                                       max_length=100,
+                                       blank=True,
+                                       default='')
+    UPDATE_ONLY_FIELDS = ('recipes_count', 'avatar_rendered')
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username']
 
@@ -1,21 +1,40 @@
 """Views.py."""
 
+from collections import defaultdict
 
 from django.contrib.auth import get_user_model
-from django.shortcuts import get_object_or_404
+from django.db import transaction
+from django.db.models import Count, Max
 from djoser import views as djoser_views
 from djoser.serializers import SetPasswordSerializer
-from rest_framework import status
+from rest_framework import exceptions, status
 from rest_framework.decorators import action
+from rest_framework.parsers import FormParser, JSONParser, MultiPartParser
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
-from foods.models import Follow
-from foods.serializers import (FollowSerializer, SubscribeSerializer,
-                               UserViewSerializer)
+from rest_framework.settings import api_settings
+from foods.cache import get_content_version
+from foods.conditional import conditional_response
+from foods.feed import followed, unfollowed
+from foods.models import Follow, Recipe
+from foods.parsers import ImageUploadParser, image_upload_data
+from foods.relations import add_relation, remove_relation
+from foods.serializers import FollowSerializer, UserViewSerializer
 
 User = get_user_model()
 
 
+def user_list_validators(view, request, *args, **kwargs):
+    """Количество пользователей и версия профилей."""
+    stamp = User.objects.aggregate(count=Count('id'), last_id=Max('id'))
+    return (stamp['count'], stamp['last_id'], get_content_version()), None
+
+
+def user_validators(view, request, *args, **kwargs):
+    """Версия профилей пользователей."""
+    return (get_content_version(),), None
+
+
 class UserViewSet(djoser_views.UserViewSet):
     """ViewSet пользователей."""
 
@@ -31,14 +50,27 @@ class UserViewSet(djoser_views.UserViewSet):
         """Разграничение ограничений."""
         return []
 
+    @conditional_response(user_list_validators)
+    def list(self, request, *args, **kwargs):
+        """Список пользователей."""
+        return super().list(request, *args, **kwargs)
+
+    @conditional_response(user_validators)
+    def retrieve(self, request, *args, **kwargs):
+        """Профиль пользователя."""
+        return super().retrieve(request, *args, **kwargs)
+
     @action(detail=True,
             url_path='me/avatar',
             methods=['put'],
-            permission_classes=[IsAuthenticated])
+            permission_classes=[IsAuthenticated],
+            parser_classes=[JSONParser, MultiPartParser, FormParser,
+                            ImageUploadParser])
     def avatar(self, request):
-        """Добавление аватара."""
+        """Добавление аватара файлом или base64."""
         user = request.user
-        serializer = UserViewSerializer(user, data=request.data, partial=True)
+        serializer = UserViewSerializer(
+            user, data=image_upload_data(request, 'avatar'), partial=True)
         if serializer.is_valid():
             serializer.save()
             return Response(serializer.data, status=status.HTTP_200_OK)
@@ -80,27 +112,44 @@ class UserViewSet(djoser_views.UserViewSet):
             )
     def subscribe(self, request, id=None):
         """Оформление подписки."""
-        author = get_object_or_404(User, pk=id)
-        user = request.user.id
+        user = request.user
+        if user.is_anonymous:
+            raise exceptions.NotAuthenticated()
 
         if self.request.method == 'POST':
-            serializer = SubscribeSerializer(
-                data={'user': user, 'author': author.id},
-                context={'request': request}
+            if str(user.id) == str(id):
+                raise exceptions.ValidationError({
+                    api_settings.NON_FIELD_ERRORS_KEY: [
+                        'Нельзя подписываться на самого себя!']
+                })
+            with transaction.atomic():
+                created = add_relation(Follow, user, 'author', id)
+                if created:
+                    followed(user, id)
+            if created is None:
+                raise exceptions.NotFound()
+            if not created:
+                raise exceptions.ValidationError({
+                    api_settings.NON_FIELD_ERRORS_KEY: [
+                        'Вы уже подписаны на этого пользователя']
+                })
+            serializer = FollowSerializer(
+                User.objects.get(pk=id), context={'request': request}
             )
-            serializer.is_valid(raise_exception=True)
-            serializer.save()
             return Response(serializer.data, status=status.HTTP_201_CREATED)
 
         if self.request.method == 'DELETE':
-            if not Follow.objects.filter(user=request.user,
-                                         author=author).exists():
+            with transaction.atomic():
+                deleted = remove_relation(Follow, user, 'author', id)
+                if deleted:
+                    unfollowed(user, id)
+            if deleted is None:
+                raise exceptions.NotFound()
+            if not deleted:
                 return Response(
                     {'errors': 'Вы не подписаны на этого пользователя'},
                     status=status.HTTP_400_BAD_REQUEST
                 )
-            Follow.objects.get(user=user,
-                               author=author.id).delete()
             return Response(status=status.HTTP_204_NO_CONTENT)
 
         return Response(status=status.HTTP_405_METHOD_NOT_ALLOWED)
@@ -112,8 +161,19 @@ class UserViewSet(djoser_views.UserViewSet):
         """Получение списка подписок."""
         user = self.request.user
         subscriptions = User.objects.filter(
-            followed__user=user
-        ).prefetch_related('recipes')
+            followed__user=user).order_by('id')
         paginated_queryset = self.paginate_queryset(subscriptions)
+
+        limit = request.query_params.get('recipes_limit')
+        recipes = Recipe.objects.latest_for_authors(
+            [author.id for author in paginated_queryset],
+            int(limit) if limit else None,
+        ).order_by('-pub_date', '-id')
+        recipes_by_author = defaultdict(list)
+        for recipe in recipes:
+            recipes_by_author[recipe.author_id].append(recipe)
+        for author in paginated_queryset:
+            author.latest_recipes = recipes_by_author[author.id]
+
         serializer = self.get_serializer(paginated_queryset, many=True)
         return self.get_paginated_response(serializer.data)